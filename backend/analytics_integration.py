@@ -9,9 +9,13 @@ import numpy as np
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
 from collections import defaultdict
+import time
 import asyncio
+import concurrent.futures
+from concurrent.futures import ThreadPoolExecutor
 from google.cloud import bigquery
 from google.oauth2 import service_account
+from ga4_rollups import EVENT_BITS, SETTLE_DAYS, GA4RollupStore, bigquery_today, table_suffix
 import logging
 
 # Configure logging
@@ -21,17 +25,44 @@ logger = logging.getLogger(__name__)
 class GA4BehaviorAnalyzer:
     """Analyzes user behavior from GA4 data to improve recommendations"""
     
-    def __init__(self, project_id: str = None, dataset_id: str = None):
+    def __init__(
+        self,
+        project_id: str = None,
+        dataset_id: str = None,
+        query_timeout: float = None,
+        rollup_path: Optional[str] = None
+    ):
         """
         Initialize GA4 behavior analyzer
         
         Args:
             project_id: GCP project ID
             dataset_id: BigQuery dataset ID for GA4 data
+            query_timeout: Default seconds a query may take before it is
+                cancelled (GA4_QUERY_TIMEOUT, default 60)
+            rollup_path: SQLite file for local daily rollups; None scans
+                BigQuery over the whole window on every call
         """
         self.project_id = project_id or os.getenv('GCP_PROJECT_ID', 'my-project-74001686249')
         self.dataset_id = dataset_id or os.getenv('GA4_DATASET', 'analytics_12010944378')
+        self.query_timeout = query_timeout or float(os.getenv('GA4_QUERY_TIMEOUT', '60'))
         self.client = None
+        
+        # The BigQuery client is blocking (job submission, polling and row
+        # paging are all HTTP calls), so queries run on this pool and the
+        # event loop only awaits their results
+        self._query_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="ga4-query")
+        
+        # Local daily rollups: windows up to retention_days are answered from
+        # the store after querying only the partitions it lacks final data
+        # for (never-seen days, plus the last settle_days that GA4 is still
+        # updating). Syncs are single-flight and at most every min_sync_interval.
+        self.rollups = GA4RollupStore(rollup_path) if rollup_path else None
+        self.settle_days = SETTLE_DAYS
+        self.min_sync_interval = 300
+        self._sync_task = None
+        self._last_sync = None  # time.monotonic() of the last successful sync
+        
         self._initialize_client()
         
     def _initialize_client(self):
@@ -55,17 +86,255 @@ class GA4BehaviorAnalyzer:
             logger.error(f"Failed to initialize BigQuery client: {e}")
             self.client = None
     
-    async def get_page_engagement_metrics(self, days: int = 7) -> Dict[str, float]:
+    async def _run_query(self, query: str, timeout: Optional[float] = None) -> List:
+        """
+        Run a query on the worker pool and fetch all result rows
+        
+        If the query exceeds the timeout or the awaiting task is cancelled,
+        the BigQuery job is cancelled in the background and the error is
+        re-raised (asyncio.TimeoutError / CancelledError).
+        
+        Args:
+            query: Standard SQL query
+            timeout: Seconds to allow (defaults to query_timeout)
+            
+        Returns:
+            List of result rows
+        """
+        timeout = timeout or self.query_timeout
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        
+        # Submission is shielded so that on timeout or cancellation the job
+        # it may still create is cancelled as soon as it exists
+        submission = self._query_executor.submit(self.client.query, query)
+        try:
+            query_job = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(submission)), timeout)
+        except (asyncio.TimeoutError, concurrent.futures.TimeoutError, asyncio.CancelledError):
+            if not submission.cancel():
+                logger.warning("BigQuery job submission timed out or was cancelled; cancelling the job once created")
+                submission.add_done_callback(self._cancel_submitted_job)
+            raise
+        
+        def fetch_rows():
+            # Bounded as well, so the worker thread is freed even if the
+            # awaiting coroutine has already given up
+            return list(query_job.result(timeout=max(deadline - loop.time(), 0.001)))
+            
+        try:
+            return await asyncio.wait_for(
+                loop.run_in_executor(self._query_executor, fetch_rows),
+                max(deadline - loop.time(), 0.001)
+            )
+        except (asyncio.TimeoutError, concurrent.futures.TimeoutError, asyncio.CancelledError):
+            logger.warning(f"Cancelling BigQuery job {query_job.job_id} after timeout or cancellation")
+            self._query_executor.submit(self._cancel_job, query_job)
+            raise
+            
+    def _cancel_submitted_job(self, submission: concurrent.futures.Future):
+        """Cancel the job a submission abandoned by its caller went on to create"""
+        if submission.cancelled() or submission.exception() is not None:
+            return
+        
+        try:
+            self._query_executor.submit(self._cancel_job, submission.result())
+        except RuntimeError:
+            # Executor already shut down
+            self._cancel_job(submission.result())
+            
+    def _cancel_job(self, query_job):
+        """Best-effort cancellation of a running BigQuery job"""
+        try:
+            query_job.cancel()
+        except Exception as e:
+            logger.warning(f"Failed to cancel BigQuery job {query_job.job_id}: {e}")
+            
+    async def _query_or_rollup(self, query: str, timeout: Optional[float], days: int, local_query) -> List:
+        """
+        Answer a windowed query from the local rollups, or run it on BigQuery
+        
+        Args:
+            query: BigQuery SQL scanning the whole window (used without a
+                rollup store or for windows longer than it retains)
+            timeout: Query timeout in seconds (defaults to query_timeout)
+            days: Window length, as in the BigQuery query
+            local_query: Callable (start_suffix, end_suffix, today) returning
+                rows shaped like the BigQuery query's
+            
+        Returns:
+            List of result rows
+        """
+        if self.rollups is None or days > self.rollups.retention_days:
+            return await self._run_query(query, timeout)
+        
+        await self._sync_rollups(timeout)
+        
+        today = bigquery_today()
+        start, end = table_suffix(today - timedelta(days=days)), table_suffix(today)
+        return await asyncio.get_running_loop().run_in_executor(
+            self._query_executor, local_query, start, end, today
+        )
+    
+    async def _sync_rollups(self, timeout: Optional[float] = None):
+        """Bring the rollup store up to date, joining a sync already in flight
+        
+        Raises the sync's error, so a window is never answered from rollups
+        that are missing the partitions that just failed to load.
+        """
+        if self._last_sync is not None and time.monotonic() - self._last_sync < self.min_sync_interval:
+            return
+        
+        if self._sync_task is None or self._sync_task.done():
+            self._sync_task = asyncio.create_task(self._fetch_new_partitions(timeout))
+        await asyncio.shield(self._sync_task)
+    
+    async def _fetch_new_partitions(self, timeout: Optional[float]):
+        """Aggregate the partitions the store lacks on BigQuery and merge them in"""
+        try:
+            loop = asyncio.get_running_loop()
+            today = bigquery_today()
+            days = await loop.run_in_executor(
+                self._query_executor, self.rollups.days_to_fetch, today, self.settle_days
+            )
+            
+            if days:
+                results = await asyncio.gather(*(
+                    self._run_query(query, timeout) for query in self._rollup_queries(days)
+                ))
+                await loop.run_in_executor(
+                    self._query_executor, self.rollups.replace_days,
+                    days, *results, today, self.settle_days
+                )
+                logger.info(f"Synced GA4 rollups for partitions {days[0]}..{days[-1]}")
+            
+            self._last_sync = time.monotonic()
+            
+        except Exception as e:
+            logger.error(f"Error syncing GA4 rollups: {e}")
+            raise
+    
+    def _rollup_queries(self, days: List[str]) -> List[str]:
+        """BigQuery SQL for the daily rollups of the given partitions
+        
+        Returns:
+            Queries for page events, page users, within-day transitions and
+            per-user first/last pages, in GA4RollupStore.replace_days order
+        """
+        table = f"`{self.project_id}.{self.dataset_id}.events_*`"
+        # Literal suffixes (generated locally, digits only) so BigQuery
+        # prunes the wildcard scan to exactly these partitions
+        partitions = f"_TABLE_SUFFIX IN ({', '.join(repr(day) for day in days)})"
+        event_names = ", ".join(repr(event) for event in EVENT_BITS)
+        event_mask = " ".join(f"WHEN {event!r} THEN {bit}" for event, bit in EVENT_BITS.items())
+        
+        page_events = f"""
+            SELECT
+                _TABLE_SUFFIX AS day,
+                page_location,
+                event_name,
+                COUNT(*) AS events,
+                SUM(engagement_time_msec) AS engagement_msec_sum,
+                COUNT(engagement_time_msec) AS engagement_msec_count,
+                MAX(event_timestamp) AS last_activity
+            FROM
+                {table}
+            WHERE
+                {partitions}
+                AND event_name IN ({event_names})
+                AND page_location IS NOT NULL
+            GROUP BY
+                day, page_location, event_name
+            """
+        
+        page_users = f"""
+            SELECT
+                _TABLE_SUFFIX AS day,
+                page_location,
+                user_pseudo_id,
+                BIT_OR(CASE event_name {event_mask} ELSE 0 END) AS event_mask
+            FROM
+                {table}
+            WHERE
+                {partitions}
+                AND event_name IN ({event_names})
+                AND page_location IS NOT NULL
+                AND user_pseudo_id IS NOT NULL
+            GROUP BY
+                day, page_location, user_pseudo_id
+            """
+        
+        transitions = f"""
+            WITH page_views AS (
+                SELECT
+                    _TABLE_SUFFIX AS day,
+                    page_location,
+                    LAG(page_location) OVER (
+                        PARTITION BY _TABLE_SUFFIX, user_pseudo_id
+                        ORDER BY event_timestamp
+                    ) AS previous_page
+                FROM
+                    {table}
+                WHERE
+                    {partitions}
+                    AND event_name = 'page_view'
+            )
+            SELECT
+                day,
+                previous_page,
+                page_location AS next_page,
+                COUNT(*) AS transition_count
+            FROM
+                page_views
+            WHERE
+                previous_page IS NOT NULL
+                AND previous_page != page_location
+            GROUP BY
+                day, previous_page, next_page
+            """
+        
+        user_day_bounds = f"""
+            SELECT
+                _TABLE_SUFFIX AS day,
+                user_pseudo_id,
+                ARRAY_AGG(page_location ORDER BY event_timestamp LIMIT 1)[OFFSET(0)] AS first_page,
+                ARRAY_AGG(page_location ORDER BY event_timestamp DESC LIMIT 1)[OFFSET(0)] AS last_page
+            FROM
+                {table}
+            WHERE
+                {partitions}
+                AND event_name = 'page_view'
+                AND page_location IS NOT NULL
+                AND user_pseudo_id IS NOT NULL
+            GROUP BY
+                day, user_pseudo_id
+            """
+        
+        return [page_events, page_users, transitions, user_day_bounds]
+    
+    def shutdown(self):
+        """Stop the query worker pool without waiting for running queries"""
+        self._query_executor.shutdown(wait=False)
+        
+    async def get_page_engagement_metrics(
+        self,
+        days: int = 7,
+        timeout: Optional[float] = None,
+        raise_errors: bool = False
+    ) -> Dict[str, float]:
         """
         Get page engagement metrics from GA4
         
         Args:
             days: Number of days to look back
+            timeout: Query timeout in seconds (defaults to query_timeout)
+            raise_errors: Raise query errors instead of returning no data
             
         Returns:
             Dictionary of page paths to engagement scores
         """
         if not self.client:
+            if raise_errors:
+                raise RuntimeError("BigQuery client not initialized")
             logger.warning("BigQuery client not initialized")
             return {}
             
@@ -95,9 +364,11 @@ class GA4BehaviorAnalyzer:
             LIMIT 100
             """
             
-            # Execute query
-            query_job = self.client.query(query)
-            results = query_job.result()
+            # Execute query off the event loop (locally when rollups cover the window)
+            results = await self._query_or_rollup(
+                query, timeout, days,
+                lambda start, end, today: self.rollups.page_engagement(start, end)
+            )
             
             # Calculate engagement scores
             engagement_scores = {}
@@ -121,19 +392,30 @@ class GA4BehaviorAnalyzer:
             
         except Exception as e:
             logger.error(f"Error fetching GA4 engagement metrics: {e}")
+            if raise_errors:
+                raise
             return {}
     
-    async def get_user_journey_patterns(self, days: int = 7) -> Dict[str, List[str]]:
+    async def get_user_journey_patterns(
+        self,
+        days: int = 7,
+        timeout: Optional[float] = None,
+        raise_errors: bool = False
+    ) -> Dict[str, List[str]]:
         """
         Analyze user journey patterns to understand content flow
         
         Args:
             days: Number of days to analyze
+            timeout: Query timeout in seconds (defaults to query_timeout)
+            raise_errors: Raise query errors instead of returning no data
             
         Returns:
             Dictionary of page paths to commonly visited next pages
         """
         if not self.client:
+            if raise_errors:
+                raise RuntimeError("BigQuery client not initialized")
             logger.warning("BigQuery client not initialized")
             return {}
             
@@ -172,8 +454,10 @@ class GA4BehaviorAnalyzer:
                 previous_page, transition_count DESC
             """
             
-            query_job = self.client.query(query)
-            results = query_job.result()
+            results = await self._query_or_rollup(
+                query, timeout, days,
+                lambda start, end, today: self.rollups.user_journeys(start, end)
+            )
             
             # Organize journey patterns
             journey_patterns = defaultdict(list)
@@ -200,20 +484,32 @@ class GA4BehaviorAnalyzer:
             
         except Exception as e:
             logger.error(f"Error analyzing user journeys: {e}")
+            if raise_errors:
+                raise
             return {}
     
-    async def get_trending_topics(self, days: int = 7, limit: int = 10) -> List[Dict]:
+    async def get_trending_topics(
+        self,
+        days: int = 7,
+        limit: int = 10,
+        timeout: Optional[float] = None,
+        raise_errors: bool = False
+    ) -> List[Dict]:
         """
         Get trending topics based on recent user interest
         
         Args:
             days: Number of days to analyze
             limit: Maximum number of trending topics
+            timeout: Query timeout in seconds (defaults to query_timeout)
+            raise_errors: Raise query errors instead of returning no data
             
         Returns:
             List of trending topics with scores
         """
         if not self.client:
+            if raise_errors:
+                raise RuntimeError("BigQuery client not initialized")
             logger.warning("BigQuery client not initialized")
             return []
             
@@ -257,8 +553,10 @@ class GA4BehaviorAnalyzer:
             LIMIT {limit}
             """
             
-            query_job = self.client.query(query)
-            results = query_job.result()
+            results = await self._query_or_rollup(
+                query, timeout, days,
+                lambda start, end, today: self.rollups.trending_activity(start, end, today, limit)
+            )
             
             trending_topics = []
             for row in results:
@@ -276,6 +574,8 @@ class GA4BehaviorAnalyzer:
             
         except Exception as e:
             logger.error(f"Error getting trending topics: {e}")
+            if raise_errors:
+                raise
             return []
     
     def _extract_path_from_url(self, url: str) -> str:
@@ -332,13 +632,24 @@ class GA4BehaviorAnalyzer:
 class EnhancedGraphRecommender:
     """Enhanced graph recommender with GA4 integration"""
     
-    def __init__(self, base_recommender, ga4_analyzer: GA4BehaviorAnalyzer):
+    def __init__(
+        self,
+        base_recommender,
+        ga4_analyzer: GA4BehaviorAnalyzer,
+        snapshot_path: Optional[str] = None,
+        refresh_interval: float = 3600,
+        retry_interval: float = 300
+    ):
         """
         Initialize enhanced recommender
         
         Args:
             base_recommender: Base NeuralGraphRecommenderMVP instance
             ga4_analyzer: GA4BehaviorAnalyzer instance
+            snapshot_path: JSON file each successful refresh is persisted to,
+                and loaded from at construction (None disables persistence)
+            refresh_interval: Seconds between background refreshes (also the TTL)
+            retry_interval: Seconds before retrying after a failed refresh
         """
         self.base_recommender = base_recommender
         self.ga4_analyzer = ga4_analyzer
@@ -346,22 +657,184 @@ class EnhancedGraphRecommender:
         self.journey_cache = {}
         self.trending_cache = []
         self.cache_timestamp = None
-        self.cache_ttl = 3600  # 1 hour cache
+        self.cache_ttl = refresh_interval
+        self.retry_interval = retry_interval
+        self.snapshot_path = snapshot_path
+        
+        # The caches above compiled into node-indexed arrays; replaced as a
+        # whole on every refresh
+        self._signals = self._compile_behavior_signals({}, {}, [])
+        
+        # Single-flight refresh: the one in-flight refresh task, shared by
+        # every caller that needs fresh signals while it runs
+        self._refresh_task = None
+        
+        # Background refresher started by start(); request paths never wait on GA4
+        self._refresher_task = None
+        
+        # time.monotonic() of the last refresh started from a request path,
+        # which retries no sooner than retry_interval while GA4 is failing
+        self._last_request_refresh = None
         
+        self._load_snapshot()
+    
+    async def start(self):
+        """Start the background refresher on the running loop"""
+        if self._refresher_task is None:
+            self._refresher_task = asyncio.create_task(self._refresh_loop())
+            logger.info(f"GA4 behavior refresher started (every {self.cache_ttl}s)")
+    
+    async def stop(self):
+        """Stop the background refresher and any refresh in flight"""
+        for task in (self._refresher_task, self._refresh_task):
+            if task and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._refresher_task = None
+    
+    async def _refresh_loop(self):
+        """Refresh signals whenever they reach refresh_interval, retrying sooner on failure"""
+        while True:
+            try:
+                age = self.get_data_age()
+                if age is None or age >= self.cache_ttl:
+                    await self.update_behavior_signals()
+                    age = self.get_data_age()
+                
+                if age is None or age >= self.cache_ttl:
+                    delay = self.retry_interval
+                else:
+                    delay = self.cache_ttl - age
+                await asyncio.sleep(delay)
+            
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Error in GA4 refresh loop: {e}")
+                await asyncio.sleep(self.retry_interval)
+    
+    def get_data_age(self) -> Optional[float]:
+        """Seconds since the served signals were fetched, or None if none are loaded"""
+        if not self.cache_timestamp:
+            return None
+        return (datetime.now() - self.cache_timestamp).total_seconds()
+    
     async def update_behavior_signals(self):
-        """Update behavior signals from GA4"""
+        """Update behavior signals from GA4, joining a refresh already in flight"""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_behavior_signals())
+        
+        # Shielded so a cancelled request does not abort the shared refresh
+        await asyncio.shield(self._refresh_task)
+    
+    async def _refresh_behavior_signals(self):
+        """Fetch the three GA4 signals concurrently and swap them in together
+        
+        A signal whose query fails keeps its previous value. Only a refresh
+        where every query succeeded advances cache_timestamp (and is
+        persisted), so a partial failure is retried after retry_interval.
+        """
         try:
             # Fetch latest data from GA4
-            self.engagement_cache = await self.ga4_analyzer.get_page_engagement_metrics()
-            self.journey_cache = await self.ga4_analyzer.get_user_journey_patterns()
-            self.trending_cache = await self.ga4_analyzer.get_trending_topics()
+            results = await asyncio.gather(
+                self.ga4_analyzer.get_page_engagement_metrics(raise_errors=True),
+                self.ga4_analyzer.get_user_journey_patterns(raise_errors=True),
+                self.ga4_analyzer.get_trending_topics(raise_errors=True),
+                return_exceptions=True
+            )
+            
+            previous = (self.engagement_cache, self.journey_cache, self.trending_cache)
+            failed = [isinstance(result, Exception) for result in results]
+            if all(failed):
+                logger.warning("GA4 behavior signal queries failed; keeping the previous data")
+                return
+            
+            engagement, journeys, trending = (
+                old if failure else new for old, new, failure in zip(previous, results, failed)
+            )
+            
+            self._signals = self._compile_behavior_signals(engagement, journeys, trending)
+            self.engagement_cache = engagement
+            self.journey_cache = journeys
+            self.trending_cache = trending
+            
+            if any(failed):
+                logger.warning("Some GA4 behavior signal queries failed; kept their previous data")
+                return
+            
             self.cache_timestamp = datetime.now()
             
             logger.info("Updated behavior signals from GA4")
             
+            if self.snapshot_path:
+                await asyncio.get_running_loop().run_in_executor(None, self._save_snapshot)
+        
         except Exception as e:
             logger.error(f"Error updating behavior signals: {e}")
     
+    def _ensure_behavior_signals(self):
+        """Start a background refresh if signals are missing or expired, without waiting
+        
+        Covers use without start(); while the refresher runs it owns refreshes
+        and retries. Until the first refresh lands, recommendations carry no
+        behavior boosts.
+        """
+        if self._is_cache_valid():
+            return
+        
+        if self._refresher_task is not None and not self._refresher_task.done():
+            return
+        
+        now = time.monotonic()
+        if self._last_request_refresh is not None and now - self._last_request_refresh < self.retry_interval:
+            return
+        
+        if self._refresh_task is None or self._refresh_task.done():
+            self._last_request_refresh = now
+            self._refresh_task = asyncio.create_task(self._refresh_behavior_signals())
+    
+    def _save_snapshot(self):
+        """Persist the current signals atomically to snapshot_path"""
+        try:
+            directory = os.path.dirname(self.snapshot_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = self.snapshot_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump({
+                    'timestamp': self.cache_timestamp.isoformat(),
+                    'engagement': self.engagement_cache,
+                    'journeys': self.journey_cache,
+                    'trending': self.trending_cache
+                }, f)
+            os.replace(tmp_path, self.snapshot_path)
+        except OSError as e:
+            logger.warning(f"Could not persist GA4 signals snapshot: {e}")
+    
+    def _load_snapshot(self):
+        """Serve the last persisted signals until the first refresh completes"""
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return
+        
+        try:
+            with open(self.snapshot_path, 'r') as f:
+                snapshot = json.load(f)
+            
+            self._signals = self._compile_behavior_signals(
+                snapshot['engagement'], snapshot['journeys'], snapshot['trending']
+            )
+            self.engagement_cache = snapshot['engagement']
+            self.journey_cache = snapshot['journeys']
+            self.trending_cache = snapshot['trending']
+            self.cache_timestamp = datetime.fromisoformat(snapshot['timestamp'])
+            logger.info(f"Loaded GA4 signals snapshot ({self.get_data_age():.0f}s old)")
+        
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable GA4 signals snapshot {self.snapshot_path}: {e}")
+    
     def _is_cache_valid(self) -> bool:
         """Check if cache is still valid"""
         if not self.cache_timestamp:
@@ -385,59 +858,138 @@ class EnhancedGraphRecommender:
         Returns:
             List of enhanced recommendations
         """
-        # Update cache if needed
-        if not self._is_cache_valid():
-            await self.update_behavior_signals()
+        # Never waits on GA4: a missing or stale cache only triggers a background refresh
+        self._ensure_behavior_signals()
         
         # Get base recommendations
         base_recs = self.base_recommender.get_recommendations(post_id, num_recommendations * 2)
         
+        return self._rerank_with_behavior_signals(post_id, base_recs, num_recommendations)
+    
+    async def get_enhanced_batch_recommendations(
+        self,
+        post_ids: List[str],
+        num_recommendations: int = 5,
+        timings: Optional[Dict[str, float]] = None
+    ) -> Dict[str, List[Dict]]:
+        """
+        Get enhanced recommendations for many posts at once
+        
+        Args:
+            post_ids: Post IDs to recommend for
+            num_recommendations: Number of recommendations per post
+            timings: Optional dict filled with per-stage timings in milliseconds
+            
+        Returns:
+            Dictionary of post IDs to enhanced recommendations
+        """
+        self._ensure_behavior_signals()
+        
+        base_results = self.base_recommender.get_batch_recommendations(
+            post_ids, num_recommendations * 2, timings=timings
+        )
+        
+        return {
+            post_id: self._rerank_with_behavior_signals(post_id, base_recs, num_recommendations)
+            for post_id, base_recs in base_results.items()
+        }
+    
+    def _compile_behavior_signals(
+        self,
+        engagement: Dict[str, float],
+        journeys: Dict[str, List[Dict]],
+        trending: List[Dict]
+    ) -> Dict:
+        """
+        Index GA4 signals by graph node for vectorized reranking
+        
+        Args:
+            engagement: Page path to engagement score
+            journeys: Source page path to its most common next pages
+            trending: Trending topics with a 'path' each
+            
+        Returns:
+            Dictionary with per-post 'engagement' scores, a 'trending' flag
+            array and 'journeys' (source node -> array of next-page nodes)
+        """
+        post_to_idx = self.base_recommender.graph_builder.post_to_idx
+        num_posts = len(self.base_recommender.graph_builder.posts)
+        path_to_idx = {f"/blog/{post_id}": idx for post_id, idx in post_to_idx.items()}
+        
+        engagement_scores = np.zeros(num_posts, dtype=np.float64)
+        for path, score in engagement.items():
+            idx = path_to_idx.get(path)
+            if idx is not None:
+                engagement_scores[idx] = score
+        
+        trending_flags = np.zeros(num_posts, dtype=bool)
+        trending_indices = [path_to_idx[t['path']] for t in trending if t.get('path') in path_to_idx]
+        trending_flags[trending_indices] = True
+        
+        journey_targets = {}
+        for from_path, destinations in journeys.items():
+            source = path_to_idx.get(from_path)
+            if source is None:
+                continue
+            targets = [path_to_idx[j['next_page']] for j in destinations if j.get('next_page') in path_to_idx]
+            if targets:
+                journey_targets[source] = np.array(targets, dtype=np.int64)
+        
+        return {
+            'engagement': engagement_scores,
+            'trending': trending_flags,
+            'journeys': journey_targets
+        }
+    
+    def _rerank_with_behavior_signals(
+        self,
+        post_id: str,
+        base_recs: List[Dict],
+        num_recommendations: int
+    ) -> List[Dict]:
+        """Boost base recommendations with the indexed GA4 signals in one vectorized pass"""
         if not base_recs:
             return []
         
-        # Enhance recommendations with GA4 data
+        signals = self._signals
+        post_to_idx = self.base_recommender.graph_builder.post_to_idx
+        
+        # Candidates outside the graph get no behavior signals
+        indices = np.array([post_to_idx.get(rec.get('id', ''), -1) for rec in base_recs], dtype=np.int64)
+        known = indices >= 0
+        safe_indices = np.where(known, indices, 0)
+        
+        engagement_scores = np.where(known, signals['engagement'][safe_indices], 0.0)
+        is_trending = known & signals['trending'][safe_indices]
+        
+        # Journeys are keyed by the source post's node, like the candidates
+        journey_targets = signals['journeys'].get(post_to_idx.get(post_id, -1))
+        if journey_targets is not None:
+            journey_relevance = known & np.isin(indices, journey_targets)
+        else:
+            journey_relevance = np.zeros(len(base_recs), dtype=bool)
+        
+        # Calculate final scores
+        base_scores = np.array([rec.get('score', 0.5) for rec in base_recs], dtype=np.float64)
+        final_scores = np.minimum(
+            base_scores
+            + engagement_scores / 100 * 0.3
+            + np.where(is_trending, 0.2, 0.0)
+            + np.where(journey_relevance, 0.1, 0.0),
+            1.0
+        )
+        
+        # Top N by final score (stable, so ties keep the base order)
         enhanced_recs = []
-        for rec in base_recs:
-            enhanced_rec = rec.copy()
-            
-            # Get post path
-            post_path = f"/blog/{rec.get('id', '')}"
-            
-            # Add engagement score
-            engagement_score = self.engagement_cache.get(post_path, 0)
-            enhanced_rec['engagement_score'] = engagement_score
-            
-            # Check if it's trending
-            is_trending = any(t['path'] == post_path for t in self.trending_cache)
-            enhanced_rec['is_trending'] = is_trending
-            
-            # Check journey patterns
-            if post_id in self.journey_cache:
-                journey_relevance = any(
-                    j['next_page'] == post_path 
-                    for j in self.journey_cache.get(f"/blog/{post_id}", [])
-                )
-                enhanced_rec['journey_relevance'] = journey_relevance
-            else:
-                enhanced_rec['journey_relevance'] = False
-            
-            # Calculate final score
-            base_score = rec.get('score', 0.5)
-            engagement_boost = engagement_score / 100 * 0.3
-            trending_boost = 0.2 if is_trending else 0
-            journey_boost = 0.1 if enhanced_rec.get('journey_relevance') else 0
-            
-            enhanced_rec['final_score'] = min(
-                base_score + engagement_boost + trending_boost + journey_boost,
-                1.0
-            )
-            
+        for i in np.argsort(-final_scores, kind='stable')[:num_recommendations]:
+            enhanced_rec = base_recs[i].copy()
+            enhanced_rec['engagement_score'] = float(engagement_scores[i])
+            enhanced_rec['is_trending'] = bool(is_trending[i])
+            enhanced_rec['journey_relevance'] = bool(journey_relevance[i])
+            enhanced_rec['final_score'] = float(final_scores[i])
             enhanced_recs.append(enhanced_rec)
         
-        # Sort by final score and return top N
-        enhanced_recs.sort(key=lambda x: x['final_score'], reverse=True)
-        
-        return enhanced_recs[:num_recommendations]
+        return enhanced_recs
     
     async def get_trending_recommendations(self, limit: int = 5) -> List[Dict]:
         """
@@ -449,8 +1001,7 @@ class EnhancedGraphRecommender:
         Returns:
             List of trending recommendations
         """
-        if not self._is_cache_valid():
-            await self.update_behavior_signals()
+        self._ensure_behavior_signals()
         
         recommendations = []
         for topic in self.trending_cache[:limit]:
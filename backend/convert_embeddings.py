@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+One-shot converter from semantic-embeddings.json to the binary embedding store
+Writes a float32 .npy matrix plus an id index next to the JSON file
+"""
+
+import os
+import sys
+
+from graph_recommender import convert_embeddings_to_binary
+
+DEFAULT_EMBEDDINGS_PATH = "../src/data/semantic-embeddings.json"
+
+def main():
+    """Convert the embeddings JSON given on the command line (or the default path)"""
+    semantic_embeddings_path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_EMBEDDINGS_PATH
+    
+    if not os.path.exists(semantic_embeddings_path):
+        print(f"❌ Semantic embeddings file not found: {semantic_embeddings_path}")
+        return False
+    
+    vectors_path, ids_path = convert_embeddings_to_binary(semantic_embeddings_path)
+    print(f"✅ Vectors: {vectors_path}")
+    print(f"✅ Id index: {ids_path}")
+    return True
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
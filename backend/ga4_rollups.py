@@ -0,0 +1,336 @@
+"""
+Local Daily Rollups of GA4 Events
+SQLite store of per-day page and transition aggregates, so GA4 windows are answered locally
+"""
+
+import os
+import math
+import sqlite3
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import Iterable, Iterator, List
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Bit per event type in page_users.event_mask
+EVENT_BITS = {'page_view': 1, 'scroll': 2, 'click': 4, 'user_engagement': 8}
+
+# Event types the engagement and trending metrics count
+ENGAGEMENT_EVENTS = ('page_view', 'scroll', 'click', 'user_engagement')
+TRENDING_EVENTS = ('page_view', 'scroll', 'user_engagement')
+
+# Days before today whose partitions are re-fetched on every sync: GA4 keeps
+# updating a daily export table for up to 72 hours, so only older days are final
+SETTLE_DAYS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS page_events (
+    day TEXT NOT NULL,
+    page_location TEXT NOT NULL,
+    event_name TEXT NOT NULL,
+    events INTEGER NOT NULL,
+    engagement_msec_sum REAL NOT NULL,
+    engagement_msec_count INTEGER NOT NULL,
+    last_activity INTEGER,
+    PRIMARY KEY (day, page_location, event_name)
+);
+CREATE TABLE IF NOT EXISTS page_users (
+    day TEXT NOT NULL,
+    page_location TEXT NOT NULL,
+    user_pseudo_id TEXT NOT NULL,
+    event_mask INTEGER NOT NULL,
+    PRIMARY KEY (day, page_location, user_pseudo_id)
+);
+CREATE TABLE IF NOT EXISTS transitions (
+    day TEXT NOT NULL,
+    previous_page TEXT NOT NULL,
+    next_page TEXT NOT NULL,
+    transition_count INTEGER NOT NULL,
+    PRIMARY KEY (day, previous_page, next_page)
+);
+CREATE TABLE IF NOT EXISTS user_day_bounds (
+    day TEXT NOT NULL,
+    user_pseudo_id TEXT NOT NULL,
+    first_page TEXT NOT NULL,
+    last_page TEXT NOT NULL,
+    PRIMARY KEY (day, user_pseudo_id)
+);
+CREATE TABLE IF NOT EXISTS ingested_days (
+    day TEXT PRIMARY KEY,
+    ingested_at TEXT NOT NULL,
+    final INTEGER NOT NULL
+);
+"""
+
+
+def table_suffix(day: date) -> str:
+    """GA4 daily table suffix (YYYYMMDD) for a date"""
+    return day.strftime('%Y%m%d')
+
+
+def bigquery_today() -> date:
+    """CURRENT_DATE() as BigQuery evaluates it (UTC)"""
+    return datetime.now(timezone.utc).date()
+
+
+class GA4RollupStore:
+    """Daily aggregates of GA4 events in a local SQLite database
+    
+    One row set per GA4 daily partition (_TABLE_SUFFIX): event counts,
+    engagement time and last activity per page and event type; distinct
+    users per page with a bitmask of the event types they produced (so
+    windows count distinct users exactly); page-view transitions within the
+    day; and each user's first and last page of the day, which links
+    transitions that cross midnight.
+    
+    Days within settle_days of today are re-aggregated on every sync since
+    GA4 keeps updating them; older days are fetched once. Every method opens
+    its own connection, so calls may come from any worker thread.
+    """
+    
+    def __init__(self, db_path: str, retention_days: int = 30):
+        """
+        Initialize the rollup store
+        
+        Args:
+            db_path: SQLite database file (created if missing)
+            retention_days: Days of rollups kept, i.e. the longest window
+                answered locally
+        """
+        self.db_path = db_path
+        self.retention_days = retention_days
+        
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+    
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Connection to the store that commits on success and is always closed"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+    
+    def days_to_fetch(self, today: date, settle_days: int = SETTLE_DAYS) -> List[str]:
+        """
+        Table suffixes in the retention window that still need to be queried
+        
+        Args:
+            today: Current date (UTC, like BigQuery's CURRENT_DATE)
+            settle_days: Days before today that GA4 may still be updating
+        
+        Returns:
+            Suffixes of days never ingested or not yet final, oldest first
+        """
+        window = [table_suffix(today - timedelta(days=offset)) for offset in range(self.retention_days, -1, -1)]
+        with self._connect() as conn:
+            final_days = {row[0] for row in conn.execute("SELECT day FROM ingested_days WHERE final = 1")}
+        return [day for day in window if day not in final_days]
+    
+    def replace_days(
+        self,
+        days: List[str],
+        page_events: Iterable,
+        page_users: Iterable,
+        transitions: Iterable,
+        user_day_bounds: Iterable,
+        today: date,
+        settle_days: int = SETTLE_DAYS
+    ):
+        """
+        Replace the rollups of the given days in one transaction
+        
+        Args:
+            days: Table suffixes that were queried (days without rows are
+                recorded as ingested too)
+            page_events: Rows with day, page_location, event_name, events,
+                engagement_msec_sum, engagement_msec_count, last_activity
+            page_users: Rows with day, page_location, user_pseudo_id, event_mask
+            transitions: Rows with day, previous_page, next_page, transition_count
+            user_day_bounds: Rows with day, user_pseudo_id, first_page, last_page
+            today: Current date; days older than settle_days are marked final
+            settle_days: Days before today that GA4 may still be updating
+        """
+        settled = table_suffix(today - timedelta(days=settle_days))
+        oldest = table_suffix(today - timedelta(days=self.retention_days))
+        ingested_at = datetime.now(timezone.utc).isoformat()
+        placeholders = ", ".join("?" for _ in days)
+        
+        with self._connect() as conn:
+            for table in ('page_events', 'page_users', 'transitions', 'user_day_bounds'):
+                conn.execute(f"DELETE FROM {table} WHERE day IN ({placeholders})", days)
+                conn.execute(f"DELETE FROM {table} WHERE day < ?", (oldest,))
+            conn.execute("DELETE FROM ingested_days WHERE day < ?", (oldest,))
+            
+            conn.executemany(
+                "INSERT INTO page_events VALUES (?, ?, ?, ?, ?, ?, ?)",
+                ((row.day, row.page_location, row.event_name, row.events,
+                  row.engagement_msec_sum or 0, row.engagement_msec_count, row.last_activity)
+                 for row in page_events)
+            )
+            conn.executemany(
+                "INSERT INTO page_users VALUES (?, ?, ?, ?)",
+                ((row.day, row.page_location, row.user_pseudo_id, row.event_mask) for row in page_users)
+            )
+            conn.executemany(
+                "INSERT INTO transitions VALUES (?, ?, ?, ?)",
+                ((row.day, row.previous_page, row.next_page, row.transition_count) for row in transitions)
+            )
+            conn.executemany(
+                "INSERT INTO user_day_bounds VALUES (?, ?, ?, ?)",
+                ((row.day, row.user_pseudo_id, row.first_page, row.last_page) for row in user_day_bounds)
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO ingested_days VALUES (?, ?, ?)",
+                ((day, ingested_at, int(day < settled)) for day in days)
+            )
+        
+        logger.info(f"Stored GA4 rollups for {len(days)} days")
+    
+    def page_engagement(self, start_day: str, end_day: str, limit: int = 100) -> List[SimpleNamespace]:
+        """
+        Per-page engagement over a window of days (inclusive suffixes)
+        
+        Returns:
+            Rows with page_location, unique_users, page_views,
+            avg_engagement_time_sec, scroll_events and click_events, by
+            page_views descending
+        """
+        mask = sum(EVENT_BITS[event] for event in ENGAGEMENT_EVENTS)
+        with self._connect() as conn:
+            rows = conn.execute(
+                """
+                WITH events AS (
+                    SELECT
+                        page_location,
+                        SUM(events) AS page_views,
+                        SUM(engagement_msec_sum) / NULLIF(SUM(engagement_msec_count), 0) / 1000 AS avg_engagement_time_sec,
+                        SUM(CASE WHEN event_name = 'scroll' THEN events ELSE 0 END) AS scroll_events,
+                        SUM(CASE WHEN event_name = 'click' THEN events ELSE 0 END) AS click_events
+                    FROM page_events
+                    WHERE day BETWEEN ? AND ?
+                    GROUP BY page_location
+                ),
+                users AS (
+                    SELECT page_location, COUNT(DISTINCT user_pseudo_id) AS unique_users
+                    FROM page_users
+                    WHERE day BETWEEN ? AND ? AND event_mask & ? != 0
+                    GROUP BY page_location
+                )
+                SELECT
+                    events.page_location, COALESCE(users.unique_users, 0), page_views,
+                    avg_engagement_time_sec, scroll_events, click_events
+                FROM events LEFT JOIN users USING (page_location)
+                ORDER BY page_views DESC
+                LIMIT ?
+                """,
+                (start_day, end_day, start_day, end_day, mask, limit)
+            ).fetchall()
+        
+        return [
+            SimpleNamespace(
+                page_location=row[0], unique_users=row[1], page_views=row[2],
+                avg_engagement_time_sec=row[3], scroll_events=row[4], click_events=row[5]
+            )
+            for row in rows
+        ]
+    
+    def user_journeys(self, start_day: str, end_day: str, min_count: int = 3) -> List[SimpleNamespace]:
+        """
+        Page-view transitions over a window of days (inclusive suffixes)
+        
+        Transitions within a day come from the daily rollups; a user's last
+        page on one active day followed by their first page on the next one
+        in the window adds the transition that spans the gap.
+        
+        Returns:
+            Rows with previous_page, next_page and transition_count (at least
+            min_count), by previous_page then count descending
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                """
+                WITH linked AS (
+                    SELECT
+                        LAG(last_page) OVER (PARTITION BY user_pseudo_id ORDER BY day) AS previous_page,
+                        first_page AS next_page
+                    FROM user_day_bounds
+                    WHERE day BETWEEN ? AND ?
+                ),
+                combined AS (
+                    SELECT previous_page, next_page, transition_count
+                    FROM transitions
+                    WHERE day BETWEEN ? AND ?
+                    UNION ALL
+                    SELECT previous_page, next_page, 1
+                    FROM linked
+                    WHERE previous_page IS NOT NULL AND previous_page != next_page
+                )
+                SELECT previous_page, next_page, SUM(transition_count) AS transition_count
+                FROM combined
+                GROUP BY previous_page, next_page
+                HAVING SUM(transition_count) >= ?
+                ORDER BY previous_page, transition_count DESC
+                """,
+                (start_day, end_day, start_day, end_day, min_count)
+            ).fetchall()
+        
+        return [
+            SimpleNamespace(previous_page=row[0], next_page=row[1], transition_count=row[2])
+            for row in rows
+        ]
+    
+    def trending_activity(self, start_day: str, end_day: str, today: date, limit: int = 10) -> List[SimpleNamespace]:
+        """
+        Pages ranked by recency-weighted activity over a window of days
+        
+        The score matches the BigQuery trending query:
+        (unique_users * 2 + total_events) * exp(-days_since_last_activity / 3).
+        
+        Returns:
+            Rows with page_location, unique_users, total_events and
+            trend_score, by trend_score descending
+        """
+        mask = sum(EVENT_BITS[event] for event in TRENDING_EVENTS)
+        event_names = ", ".join(f"'{event}'" for event in TRENDING_EVENTS)
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"""
+                WITH events AS (
+                    SELECT page_location, SUM(events) AS total_events, MAX(last_activity) AS last_activity
+                    FROM page_events
+                    WHERE day BETWEEN ? AND ? AND event_name IN ({event_names})
+                    GROUP BY page_location
+                ),
+                users AS (
+                    SELECT page_location, COUNT(DISTINCT user_pseudo_id) AS unique_users
+                    FROM page_users
+                    WHERE day BETWEEN ? AND ? AND event_mask & ? != 0
+                    GROUP BY page_location
+                )
+                SELECT events.page_location, COALESCE(users.unique_users, 0), total_events, last_activity
+                FROM events LEFT JOIN users USING (page_location)
+                """,
+                (start_day, end_day, start_day, end_day, mask)
+            ).fetchall()
+        
+        trending = []
+        for page_location, unique_users, total_events, last_activity in rows:
+            last_day = datetime.fromtimestamp(last_activity / 1e6, timezone.utc).date()
+            trend_score = (unique_users * 2 + total_events) * math.exp(-(today - last_day).days / 3.0)
+            trending.append(SimpleNamespace(
+                page_location=page_location, unique_users=unique_users,
+                total_events=total_events, trend_score=trend_score
+            ))
+        
+        trending.sort(key=lambda row: row.trend_score, reverse=True)
+        return trending[:limit]
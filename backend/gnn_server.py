@@ -1,10 +1,11 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Dict, Optional
 import os
 import json
-from graph_recommender import NeuralGraphRecommenderMVP
+from graph_recommender import NeuralGraphRecommenderMVP, embedding_store_paths, DEFAULT_CACHE_DIR
+from graph_centrality import GraphCentrality
 from analytics_integration import GA4BehaviorAnalyzer, EnhancedGraphRecommender
 from realtime_learning import RealtimeLearningEngine
 import asyncio
@@ -27,11 +28,46 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Upper bound on post ids answered by a single batch request
+MAX_BATCH_POST_IDS = 100
+
+# Depth of the precomputed neighbor table (0 disables it and scores on demand)
+NEIGHBOR_INDEX_K = int(os.getenv("GNN_NEIGHBOR_INDEX_K", "20"))
+
+# Optional cap on similarity edges per post when building the graph
+GRAPH_MAX_NEIGHBORS = int(os.getenv("GNN_GRAPH_MAX_NEIGHBORS", "0")) or None
+
+# Optional graph snapshot (e.g. RealtimeLearningEngine.export_learned_graph output)
+# served instead of the graph built from the embeddings
+GRAPH_SNAPSHOT_PATH = os.getenv("GNN_GRAPH_SNAPSHOT") or None
+
+# Durable interaction log replayed on startup (set to an empty string to disable)
+INTERACTION_LOG_DIR = os.getenv(
+    "GNN_INTERACTION_LOG_DIR", os.path.join(DEFAULT_CACHE_DIR, "interactions")
+) or None
+
+# GA4 behavior signals: refreshed in the background on this schedule and
+# persisted to a snapshot that is served immediately after a restart
+GA4_REFRESH_INTERVAL = float(os.getenv("GA4_REFRESH_INTERVAL", "3600"))
+GA4_SIGNALS_SNAPSHOT = os.getenv(
+    "GA4_SIGNALS_SNAPSHOT", os.path.join(DEFAULT_CACHE_DIR, "ga4-signals.json")
+) or None
+
+# Local daily GA4 rollups: each refresh queries only the partitions not yet
+# stored, and the 7/14/30-day windows are aggregated from SQLite
+GA4_ROLLUP_DB = os.getenv(
+    "GA4_ROLLUP_DB", os.path.join(DEFAULT_CACHE_DIR, "ga4-rollups.sqlite")
+) or None
+
+# Centrality metrics selectable via /trending?method=
+CENTRALITY_METHODS = ("gnn",) + GraphCentrality.METHODS
+
 # Global recommender instances
 recommender = None
 enhanced_recommender = None
 ga4_analyzer = None
 realtime_engine = None
+main_loop = None  # event loop serving requests; background engines run on it
 initialization_status = {"initialized": False, "error": None, "ga4_enabled": False, "realtime_learning": False}
 
 class RecommendationRequest(BaseModel):
@@ -44,6 +80,17 @@ class RecommendationResponse(BaseModel):
     success: bool
     message: Optional[str] = None
 
+class BatchRecommendationRequest(BaseModel):
+    post_ids: List[str]
+    num_recommendations: Optional[int] = 5
+
+class BatchRecommendationResponse(BaseModel):
+    results: Dict[str, List[Dict]]
+    missing: List[str]
+    timing: Dict[str, float]
+    success: bool
+    message: Optional[str] = None
+
 class InteractionRequest(BaseModel):
     user_id: Optional[str] = None
     post_id: str
@@ -56,6 +103,7 @@ class StatusResponse(BaseModel):
     num_posts: Optional[int] = None
     num_edges: Optional[int] = None
     ga4_enabled: Optional[bool] = False
+    behavior_data_age_seconds: Optional[float] = None
     features: Optional[List[str]] = None
 
 def initialize_recommender():
@@ -70,13 +118,18 @@ def initialize_recommender():
         # Check if files exist
         if not os.path.exists(semantic_mapping_path):
             raise FileNotFoundError(f"Semantic mapping file not found: {semantic_mapping_path}")
-        if not os.path.exists(semantic_embeddings_path):
+        if not os.path.exists(semantic_embeddings_path) and not all(
+            os.path.exists(path) for path in embedding_store_paths(semantic_embeddings_path)
+        ):
             raise FileNotFoundError(f"Semantic embeddings file not found: {semantic_embeddings_path}")
         
         # Initialize base recommender
         recommender = NeuralGraphRecommenderMVP(
             semantic_mapping_path=semantic_mapping_path,
-            semantic_embeddings_path=semantic_embeddings_path
+            semantic_embeddings_path=semantic_embeddings_path,
+            neighbor_index_k=NEIGHBOR_INDEX_K,
+            graph_max_neighbors=GRAPH_MAX_NEIGHBORS,
+            graph_snapshot_path=GRAPH_SNAPSHOT_PATH
         )
         
         success = recommender.initialize()
@@ -87,8 +140,14 @@ def initialize_recommender():
             
             # Try to initialize GA4 integration
             try:
-                ga4_analyzer = GA4BehaviorAnalyzer()
-                enhanced_recommender = EnhancedGraphRecommender(recommender, ga4_analyzer)
+                ga4_analyzer = GA4BehaviorAnalyzer(rollup_path=GA4_ROLLUP_DB)
+                enhanced_recommender = EnhancedGraphRecommender(
+                    recommender,
+                    ga4_analyzer,
+                    snapshot_path=GA4_SIGNALS_SNAPSHOT,
+                    refresh_interval=GA4_REFRESH_INTERVAL
+                )
+                asyncio.run_coroutine_threadsafe(enhanced_recommender.start(), main_loop).result(timeout=10)
                 initialization_status["ga4_enabled"] = True
                 logger.info("✅ GA4 integration enabled successfully!")
             except Exception as ga4_error:
@@ -98,8 +157,10 @@ def initialize_recommender():
             # Initialize real-time learning engine
             try:
                 global realtime_engine
-                realtime_engine = RealtimeLearningEngine(recommender)
-                asyncio.create_task(realtime_engine.start())
+                realtime_engine = RealtimeLearningEngine(recommender, log_dir=INTERACTION_LOG_DIR)
+                # Initialization runs in a worker thread, so schedule onto the server loop
+                # (start() replays the interaction log before accepting new events)
+                asyncio.run_coroutine_threadsafe(realtime_engine.start(), main_loop).result(timeout=120)
                 initialization_status["realtime_learning"] = True
                 logger.info("✅ Real-time learning engine started successfully!")
             except Exception as rt_error:
@@ -115,9 +176,22 @@ def initialize_recommender():
 @app.on_event("startup")
 async def startup_event():
     """Initialize recommender on startup"""
+    global main_loop
+    main_loop = asyncio.get_running_loop()
+    
     # Run initialization in a separate thread to avoid blocking
     threading.Thread(target=initialize_recommender, daemon=True).start()
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background engines, flushing queued interactions"""
+    if realtime_engine:
+        await realtime_engine.stop()
+    if enhanced_recommender:
+        await enhanced_recommender.stop()
+    if ga4_analyzer:
+        ga4_analyzer.shutdown()
+
 @app.get("/")
 async def root():
     return {"message": "Neural Graph Recommender MVP", "version": "1.0.0"}
@@ -125,7 +199,7 @@ async def root():
 @app.get("/status", response_model=StatusResponse)
 async def get_status():
     """Get initialization status and system info"""
-    global recommender, initialization_status
+    global recommender, enhanced_recommender, initialization_status
     
     status = {
         "initialized": initialization_status["initialized"],
@@ -137,6 +211,8 @@ async def get_status():
     features = ["graph_recommendations", "trending_posts", "similarity_scoring"]
     if initialization_status.get("ga4_enabled"):
         features.extend(["ga4_engagement", "user_journeys", "enhanced_trending"])
+        if enhanced_recommender:
+            status["behavior_data_age_seconds"] = enhanced_recommender.get_data_age()
     if initialization_status.get("realtime_learning"):
         features.extend(["realtime_learning", "interaction_tracking", "online_updates"])
     status["features"] = features
@@ -192,6 +268,67 @@ async def get_recommendations(request: RecommendationRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting recommendations: {str(e)}")
 
+@app.post("/recommendations/batch", response_model=BatchRecommendationResponse)
+async def get_batch_recommendations(request: BatchRecommendationRequest):
+    """Get recommendations for many blog posts in one similarity pass"""
+    global recommender, enhanced_recommender, initialization_status
+    
+    if not initialization_status["initialized"]:
+        if initialization_status["error"]:
+            raise HTTPException(
+                status_code=503,
+                detail=f"Recommender not initialized: {initialization_status['error']}"
+            )
+        else:
+            raise HTTPException(
+                status_code=503,
+                detail="Recommender is still initializing. Please try again in a moment."
+            )
+    
+    # Deduplicate while keeping the caller's order
+    post_ids = list(dict.fromkeys(request.post_ids))
+    if len(post_ids) > MAX_BATCH_POST_IDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many post_ids: {len(post_ids)} (max {MAX_BATCH_POST_IDS})"
+        )
+    
+    try:
+        start = time.perf_counter()
+        timing = {}
+        
+        if initialization_status.get("ga4_enabled") and enhanced_recommender:
+            results = await enhanced_recommender.get_enhanced_batch_recommendations(
+                post_ids=post_ids,
+                num_recommendations=request.num_recommendations,
+                timings=timing
+            )
+            message = f"Found GA4-enhanced recommendations for {len(post_ids)} posts"
+        else:
+            results = recommender.get_batch_recommendations(
+                post_ids=post_ids,
+                num_recommendations=request.num_recommendations,
+                timings=timing
+            )
+            message = f"Found recommendations for {len(post_ids)} posts"
+        
+        timing["total_ms"] = (time.perf_counter() - start) * 1000
+        missing = [
+            post_id for post_id in post_ids
+            if post_id not in recommender.graph_builder.post_to_idx
+        ]
+        
+        return BatchRecommendationResponse(
+            results=results,
+            missing=missing,
+            timing={key: round(value, 3) for key, value in timing.items()},
+            success=True,
+            message=message
+        )
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting batch recommendations: {str(e)}")
+
 @app.get("/recommendations/{post_id}")
 async def get_recommendations_get(post_id: str, num_recommendations: int = 5):
     """GET endpoint for recommendations (alternative to POST)"""
@@ -202,21 +339,32 @@ async def get_recommendations_get(post_id: str, num_recommendations: int = 5):
     return await get_recommendations(request)
 
 @app.get("/trending")
-async def get_trending_posts():
-    """Get trending posts based on graph centrality scores and GA4 data"""
+async def get_trending_posts(method: Optional[str] = None):
+    """Get trending posts based on graph centrality scores and GA4 data
+    
+    ``method`` selects a graph centrality metric (gnn, pagerank, degree,
+    eigenvector) and bypasses GA4; without it GA4 trending is used when enabled.
+    """
     global recommender, enhanced_recommender, initialization_status
     
     if not initialization_status["initialized"]:
         raise HTTPException(status_code=503, detail="Recommender not initialized")
     
+    if method is not None and method not in CENTRALITY_METHODS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown centrality method '{method}'. Use one of: {', '.join(CENTRALITY_METHODS)}"
+        )
+    
     try:
         # Use GA4 trending if available
-        if initialization_status.get("ga4_enabled") and enhanced_recommender:
+        if method is None and initialization_status.get("ga4_enabled") and enhanced_recommender:
             trending_posts = await enhanced_recommender.get_trending_recommendations(limit=10)
             message = "Found GA4-powered trending posts"
         else:
-            trending_posts = recommender.get_all_posts_with_scores()[:10]
-            message = f"Found {len(trending_posts)} posts with centrality scores"
+            method = method or "gnn"
+            trending_posts = recommender.get_all_posts_with_scores(limit=10, method=method)
+            message = f"Found {len(trending_posts)} posts with {method} centrality scores"
         
         return {
             "trending_posts": trending_posts,
@@ -228,29 +376,24 @@ async def get_trending_posts():
         raise HTTPException(status_code=500, detail=f"Error getting trending posts: {str(e)}")
 
 @app.get("/posts")
-async def get_all_posts():
-    """Get all blog posts with metadata"""
+async def get_all_posts(request: Request):
+    """Get all blog posts with metadata (pre-serialized, ETag-validated)"""
     global recommender, initialization_status
     
     if not initialization_status["initialized"]:
         raise HTTPException(status_code=503, detail="Recommender not initialized")
     
     try:
-        posts = []
-        for post in recommender.graph_builder.posts:
-            posts.append({
-                'id': post['id'],
-                'title': post.get('title', 'Untitled'),
-                'url': post.get('url', ''),
-                'excerpt': post.get('excerpt', ''),
-                'tags': post.get('extracted_tags', [])
-            })
+        body, etag = recommender.get_posts_payload()
         
-        return {
-            "posts": posts,
-            "success": True,
-            "message": f"Retrieved {len(posts)} blog posts"
-        }
+        # Clients revalidating an unchanged payload get an empty 304
+        if_none_match = request.headers.get("if-none-match", "")
+        client_etags = {tag.strip() for tag in if_none_match.split(",")}
+        client_etags |= {tag[2:] for tag in client_etags if tag.startswith("W/")}
+        if etag in client_etags or "*" in client_etags:
+            return Response(status_code=304, headers={"ETag": etag})
+        
+        return Response(content=body, media_type="application/json", headers={"ETag": etag})
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting posts: {str(e)}")
@@ -271,14 +414,20 @@ async def track_interaction(interaction: InteractionRequest):
         }
     
     try:
-        # Record interaction for learning
-        realtime_engine.record_interaction({
+        # Enqueue for learning; processing happens off the request path
+        accepted = realtime_engine.record_interaction({
             "user_id": interaction.user_id or "anonymous",
             "post_id": interaction.post_id,
             "action": interaction.action,
             "context": interaction.context or {}
         })
         
+        if not accepted:
+            return {
+                "success": False,
+                "message": "Interaction dropped: ingestion queue is full"
+            }
+        
         return {
             "success": True,
             "message": f"Interaction recorded: {interaction.action} on {interaction.post_id}"
@@ -321,10 +470,11 @@ async def trigger_model_update():
         )
     
     try:
-        await realtime_engine.update_model()
+        updated = await realtime_engine.update_model()
         return {
             "success": True,
-            "message": "Model update triggered successfully"
+            "message": "Model update triggered successfully" if updated
+            else "Model update skipped: no new interactions since the last update"
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error updating model: {str(e)}")
@@ -0,0 +1,153 @@
+"""
+Graph Centrality Metrics for Neural Graph Recommender
+Computes PageRank, degree and eigenvector centrality with sparse power iteration
+"""
+
+import numpy as np
+import scipy.sparse as sp
+import torch
+from typing import Dict, Optional
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class GraphCentrality:
+    """Sparse centrality metrics over a PyTorch Geometric edge_index
+    
+    PageRank and eigenvector centrality are warm-started from the previous
+    result, so recomputing after the real-time engine adds a handful of
+    edges converges in a few iterations instead of starting from uniform.
+    """
+    
+    METHODS = ('pagerank', 'degree', 'eigenvector')
+    
+    def __init__(self, damping: float = 0.85, tol: float = 1e-6, max_iter: int = 100):
+        """
+        Initialize centrality calculator
+        
+        Args:
+            damping: PageRank damping factor
+            tol: L1 convergence tolerance for power iteration
+            max_iter: Maximum power iterations per metric
+        """
+        self.damping = damping
+        self.tol = tol
+        self.max_iter = max_iter
+        
+        # Last converged vectors, reused as starting points
+        self._pagerank = None
+        self._eigenvector = None
+        self.last_iterations = {}
+    
+    def compute(
+        self,
+        edge_index: torch.Tensor,
+        num_nodes: int,
+        edge_weight: Optional[torch.Tensor] = None
+    ) -> Dict[str, np.ndarray]:
+        """
+        Compute all centrality metrics for the graph
+        
+        Args:
+            edge_index: (2, E) tensor of directed edges
+            num_nodes: Number of nodes in the graph
+            edge_weight: Optional (E,) tensor of edge weights
+        
+        Returns:
+            Dictionary of method name to a (num_nodes,) score array
+        """
+        adjacency = self._adjacency(edge_index, num_nodes, edge_weight)
+        
+        return {
+            'pagerank': self._compute_pagerank(adjacency),
+            'degree': self._compute_degree(adjacency),
+            'eigenvector': self._compute_eigenvector(adjacency)
+        }
+    
+    def _adjacency(
+        self,
+        edge_index: torch.Tensor,
+        num_nodes: int,
+        edge_weight: Optional[torch.Tensor]
+    ) -> sp.csr_matrix:
+        """Build a CSR matrix with A[dst, src] = weight (duplicate edges are summed)"""
+        src = edge_index[0].cpu().numpy()
+        dst = edge_index[1].cpu().numpy()
+        if edge_weight is not None:
+            weights = edge_weight.detach().cpu().numpy().astype(np.float64)
+        else:
+            weights = np.ones(len(src), dtype=np.float64)
+        
+        return sp.csr_matrix((weights, (dst, src)), shape=(num_nodes, num_nodes))
+    
+    def _warm_start(self, previous: Optional[np.ndarray], num_nodes: int) -> np.ndarray:
+        """Previous vector resized to num_nodes (new nodes get the mean), normalized to sum 1"""
+        if previous is None or len(previous) == 0:
+            return np.full(num_nodes, 1.0 / num_nodes)
+        
+        start = np.full(num_nodes, previous.mean())
+        overlap = min(num_nodes, len(previous))
+        start[:overlap] = previous[:overlap]
+        return start / start.sum()
+    
+    def _compute_pagerank(self, adjacency: sp.csr_matrix) -> np.ndarray:
+        """PageRank by power iteration, with dangling mass spread uniformly"""
+        num_nodes = adjacency.shape[0]
+        if num_nodes == 0:
+            return np.zeros(0)
+        
+        out_weight = np.asarray(adjacency.sum(axis=0)).ravel()
+        dangling = out_weight == 0
+        inv_out = np.divide(1.0, out_weight, out=np.zeros_like(out_weight), where=~dangling)
+        transition = adjacency @ sp.diags(inv_out)
+        
+        rank = self._warm_start(self._pagerank, num_nodes)
+        teleport = (1.0 - self.damping) / num_nodes
+        
+        iterations = 0
+        for iterations in range(1, self.max_iter + 1):
+            dangling_mass = self.damping * rank[dangling].sum() / num_nodes
+            updated = self.damping * (transition @ rank) + teleport + dangling_mass
+            converged = np.abs(updated - rank).sum() < self.tol
+            rank = updated
+            if converged:
+                break
+        
+        self._pagerank = rank
+        self.last_iterations['pagerank'] = iterations
+        return rank
+    
+    def _compute_degree(self, adjacency: sp.csr_matrix) -> np.ndarray:
+        """Weighted in-degree normalized by the maximum possible degree"""
+        num_nodes = adjacency.shape[0]
+        degree = np.asarray(adjacency.sum(axis=1)).ravel()
+        return degree / max(num_nodes - 1, 1)
+    
+    def _compute_eigenvector(self, adjacency: sp.csr_matrix) -> np.ndarray:
+        """Eigenvector centrality by power iteration on A + I (avoids oscillation on bipartite parts)"""
+        num_nodes = adjacency.shape[0]
+        if num_nodes == 0:
+            return np.zeros(0)
+        
+        vector = self._warm_start(self._eigenvector, num_nodes)
+        
+        iterations = 0
+        for iterations in range(1, self.max_iter + 1):
+            updated = vector + adjacency @ vector
+            total = updated.sum()
+            if total == 0:
+                break
+            updated /= total
+            converged = np.abs(updated - vector).sum() < self.tol
+            vector = updated
+            if converged:
+                break
+        
+        self._eigenvector = vector
+        self.last_iterations['eigenvector'] = iterations
+        
+        # Report on the unit-L2 scale used by networkx
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
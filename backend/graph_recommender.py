@@ -9,8 +9,187 @@ from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
 import time
+import hashlib
 from typing import List, Dict, Tuple, Optional
 import re
+from graph_centrality import GraphCentrality
+
+# Default directory for derived artifacts (neighbor index, ...)
+DEFAULT_CACHE_DIR = os.getenv(
+    'GNN_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache')
+)
+
+# Record layout of the persisted neighbor index: one row per post, K columns
+NEIGHBOR_INDEX_DTYPE = np.dtype([('ids', '<i4'), ('scores', '<f2')])
+
+# Bump when the checkpoint layout or training procedure changes
+CHECKPOINT_VERSION = 2
+
+# Bump when the exported graph snapshot layout changes
+GRAPH_SNAPSHOT_VERSION = 3
+
+# Interaction signals with a dedicated node feature column each, appended
+# after the embedding and metadata columns (zero until the real-time
+# engine records the signal)
+SIGNAL_FEATURES = ('search_relevance',)
+
+
+def content_hash(paths: List[str], *extra) -> str:
+    """Hash the contents of the given files plus any extra parameters"""
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+    for value in extra:
+        digest.update(repr(value).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Return the indices of the k highest scores per row, sorted descending"""
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        return np.empty((scores.shape[0], 0), dtype=np.int64)
+    if k < scores.shape[1]:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.tile(np.arange(scores.shape[1]), (scores.shape[0], 1))
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1, kind='stable')
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+def sample_negative_pairs(
+    num_nodes: int,
+    num_samples: int,
+    edge_keys: torch.Tensor,
+    oversample: int = 2
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Sample up to num_samples random (src, dst) pairs that are not edges
+    
+    Args:
+        num_nodes: Nodes are drawn uniformly from [0, num_nodes)
+        num_samples: Maximum number of pairs to return
+        edge_keys: Existing edges encoded as src * num_nodes + dst
+        oversample: Candidates drawn per requested pair, so that rejecting
+            self-loops and existing edges rarely leaves the batch short
+    """
+    if num_nodes < 2 or num_samples <= 0:
+        empty = torch.empty(0, dtype=torch.long)
+        return empty, empty
+    
+    candidates = torch.randint(0, num_nodes, (2, num_samples * oversample))
+    src, dst = candidates[0], candidates[1]
+    keep = (src != dst) & ~torch.isin(src * num_nodes + dst, edge_keys)
+    return src[keep][:num_samples], dst[keep][:num_samples]
+
+
+def embedding_store_paths(semantic_embeddings_path: str) -> Tuple[str, str]:
+    """Binary store paths (vectors, id index) derived from the embeddings JSON path"""
+    base, _ = os.path.splitext(semantic_embeddings_path)
+    return f"{base}.f32.npy", f"{base}.ids.json"
+
+
+def convert_embeddings_to_binary(semantic_embeddings_path: str) -> Tuple[str, str]:
+    """Convert semantic-embeddings.json into a float32 .npy matrix plus an id index
+    
+    The id index records a content hash of the source JSON so loaders can
+    tell when the binary store has gone stale.
+    """
+    with open(semantic_embeddings_path, 'r') as f:
+        embeddings_data = json.load(f)
+    
+    entries = [emb for emb in embeddings_data if 'vector' in emb]
+    vectors = np.asarray([emb['vector'] for emb in entries], dtype=np.float32)
+    if vectors.ndim != 2:
+        vectors = vectors.reshape(len(entries), -1)
+    
+    vectors_path, ids_path = embedding_store_paths(semantic_embeddings_path)
+    np.save(vectors_path, vectors)
+    with open(ids_path, 'w') as f:
+        json.dump({
+            'ids': [emb.get('id') for emb in entries],
+            'dim': int(vectors.shape[1]),
+            'source_hash': content_hash([semantic_embeddings_path])
+        }, f)
+    
+    print(f"Converted {len(entries)} embeddings to {vectors_path}")
+    return vectors_path, ids_path
+
+def signal_feature_columns(num_features: int) -> Dict[str, int]:
+    """Column index of each SIGNAL_FEATURES entry in node features num_features wide"""
+    first = num_features - len(SIGNAL_FEATURES)
+    return {name: first + offset for offset, name in enumerate(SIGNAL_FEATURES)}
+
+
+def save_graph_snapshot(
+    path: str,
+    graph_data: Data,
+    post_ids: List[str],
+    stats: Optional[Dict] = None,
+    base_weight: Optional[np.ndarray] = None
+):
+    """Write a graph to an uncompressed .npz snapshot
+    
+    Edges are stored as a (2, E) int32 array, weights and node features as
+    float32, post ids in node order, and stats as a JSON string, so the file
+    loads without pickle and without rebuilding the graph from the embeddings.
+    
+    Args:
+        path: Destination file (written to a temporary file, then renamed)
+        graph_data: Graph with x, edge_index and optionally edge_weight
+        post_ids: Post id of every post node, in node order
+        stats: Optional JSON-serializable metadata
+        base_weight: Structural part of each edge's weight, aligned with
+            edge_index (the rest is learned interaction weight); defaults to
+            the full edge weight, i.e. every edge structural
+    """
+    edge_weight = getattr(graph_data, 'edge_weight', None)
+    if edge_weight is None:
+        edge_weight = torch.ones(graph_data.edge_index.shape[1])
+    edge_weight = edge_weight.detach().numpy().astype(np.float32)
+    base_weight = edge_weight if base_weight is None else np.asarray(base_weight, dtype=np.float32)
+    
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez(
+            f,
+            version=np.int32(GRAPH_SNAPSHOT_VERSION),
+            edge_index=graph_data.edge_index.numpy().astype(np.int32),
+            edge_weight=edge_weight,
+            base_weight=base_weight,
+            x=graph_data.x.detach().numpy().astype(np.float32),
+            post_ids=np.array(post_ids, dtype=str),
+            stats=np.array(json.dumps(stats or {}, default=str))
+        )
+    os.replace(tmp_path, path)
+
+
+def load_graph_snapshot(path: str) -> Tuple[Data, List[str], Dict, np.ndarray]:
+    """Read a snapshot written by save_graph_snapshot
+    
+    Returns:
+        (graph Data with int64 edge_index, post ids in node order, stats,
+        structural part of each edge weight as float32)
+    """
+    with np.load(path, allow_pickle=False) as snapshot:
+        version = int(snapshot['version'])
+        if version != GRAPH_SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported graph snapshot version {version} in {path}")
+        
+        graph_data = Data(
+            x=torch.from_numpy(snapshot['x']),
+            edge_index=torch.from_numpy(snapshot['edge_index'].astype(np.int64)),
+            edge_weight=torch.from_numpy(snapshot['edge_weight'])
+        )
+        return (
+            graph_data,
+            snapshot['post_ids'].tolist(),
+            json.loads(str(snapshot['stats'])),
+            snapshot['base_weight']
+        )
 
 class BlogPostGraphBuilder:
     """Builds a graph from blog posts and their relationships"""
@@ -19,7 +198,9 @@ class BlogPostGraphBuilder:
         self.semantic_mapping_path = semantic_mapping_path
         self.semantic_embeddings_path = semantic_embeddings_path
         self.posts = []
-        self.embeddings = []
+        self.embeddings = np.empty((0, 768), dtype=np.float32)
+        self.embedding_ids = []
+        self.embeddings_source = semantic_embeddings_path  # file the embeddings were read from
         self.post_to_idx = {}
         self.tag_to_idx = {}
         self.idx_to_post = {}
@@ -31,15 +212,9 @@ class BlogPostGraphBuilder:
             with open(self.semantic_mapping_path, 'r') as f:
                 self.posts = json.load(f)
             
-            # Load semantic embeddings  
-            with open(self.semantic_embeddings_path, 'r') as f:
-                embeddings_data = json.load(f)
-                
-            # Convert embeddings to list format for easier access
-            self.embeddings = []
-            for emb in embeddings_data:
-                if 'vector' in emb:
-                    self.embeddings.append(emb['vector'])
+            # Load semantic embeddings, preferring the binary store
+            if not self._load_binary_embeddings():
+                self._load_json_embeddings()
                 
             # Create mappings
             for idx, post in enumerate(self.posts):
@@ -53,6 +228,52 @@ class BlogPostGraphBuilder:
             print(f"Error loading blog data: {e}")
             return False
     
+    def _load_binary_embeddings(self) -> bool:
+        """Memory-map the binary embedding store if it exists and is current"""
+        vectors_path, ids_path = embedding_store_paths(self.semantic_embeddings_path)
+        if not (os.path.exists(vectors_path) and os.path.exists(ids_path)):
+            return False
+        
+        try:
+            with open(ids_path, 'r') as f:
+                index = json.load(f)
+            
+            # A regenerated JSON invalidates the binary copy
+            if os.path.exists(self.semantic_embeddings_path):
+                if index.get('source_hash') != content_hash([self.semantic_embeddings_path]):
+                    print(f"Binary embeddings {vectors_path} are stale, falling back to JSON")
+                    return False
+            
+            embeddings = np.load(vectors_path, mmap_mode='r')
+            if embeddings.shape[0] != len(index['ids']):
+                print(f"Binary embeddings {vectors_path} do not match their id index")
+                return False
+            
+            self.embeddings = embeddings
+            self.embedding_ids = index['ids']
+            self.embeddings_source = vectors_path
+            print(f"Memory-mapped {embeddings.shape[0]} embeddings from {vectors_path}")
+            return True
+            
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error loading binary embeddings: {e}")
+            return False
+    
+    def _load_json_embeddings(self):
+        """Parse embeddings from the JSON export into a float32 matrix"""
+        with open(self.semantic_embeddings_path, 'r') as f:
+            embeddings_data = json.load(f)
+        
+        entries = [emb for emb in embeddings_data if 'vector' in emb]
+        if entries:
+            self.embeddings = np.asarray([emb['vector'] for emb in entries], dtype=np.float32)
+        self.embedding_ids = [emb.get('id') for emb in entries]
+        self.embeddings_source = self.semantic_embeddings_path
+    
+    def source_paths(self) -> List[str]:
+        """Input files the graph is built from, for content-hash cache keys"""
+        return [self.semantic_mapping_path, self.embeddings_source]
+    
     def extract_tags_from_posts(self):
         """Extract and index all unique tags from blog posts"""
         all_tags = set()
@@ -88,76 +309,118 @@ class BlogPostGraphBuilder:
         print(f"Extracted {len(all_tags)} unique tags")
         return list(all_tags)
     
-    def build_graph(self, similarity_threshold: float = 0.3):
-        """Build PyTorch Geometric graph from blog posts"""
+    def build_graph(
+        self,
+        similarity_threshold: float = 0.3,
+        max_neighbors: Optional[int] = None,
+        chunk_size: int = 1024
+    ):
+        """Build PyTorch Geometric graph from blog posts
+        
+        Args:
+            similarity_threshold: Minimum cosine similarity for a post-post edge
+            max_neighbors: If set, each post keeps only its most similar
+                neighbors above the threshold (edges are symmetrized, so a
+                node may still end up with more than this many)
+            chunk_size: Posts per block when scanning the similarity matrix
+        """
         num_posts = len(self.posts)
         num_tags = len(self.tag_to_idx)
         total_nodes = num_posts + num_tags
+        num_embedded = min(len(self.embeddings), num_posts)
+        embedding_dim = self.embeddings.shape[1] if num_embedded > 0 else 768
         
-        # Node features
-        node_features = []
+        # Node features: embedding + 3 metadata columns + one column per
+        # interaction signal, filled in place
+        x = torch.zeros((total_nodes, embedding_dim + 3 + len(SIGNAL_FEATURES)), dtype=torch.float)
+        metadata = slice(embedding_dim, embedding_dim + 3)
         
-        # Post node features (use embeddings + metadata)
-        for i, post in enumerate(self.posts):
-            if i < len(self.embeddings):
-                embedding = self.embeddings[i]
-                # Add simple metadata features
-                metadata_features = [
+        # Post node features (use embeddings + metadata); posts without an
+        # embedding keep an all-zero row
+        if num_embedded > 0:
+            x[:num_embedded, :embedding_dim] = torch.from_numpy(
+                np.asarray(self.embeddings[:num_embedded], dtype=np.float32)
+            )
+            x[:num_embedded, metadata] = torch.tensor([
+                [
                     len(post.get('title', '')),  # title length
-                    len(post.get('excerpt', '')),  # excerpt length  
+                    len(post.get('excerpt', '')),  # excerpt length
                     len(post.get('extracted_tags', [])),  # number of tags
                 ]
-                features = embedding + metadata_features
-            else:
-                # Fallback for missing embeddings
-                features = [0.0] * (768 + 3)
-            
-            node_features.append(features)
-        
-        # Tag node features (simple one-hot style)
-        for tag in sorted(self.tag_to_idx.keys()):
-            # Simple tag features for MVP
-            tag_features = [0.0] * 768 + [1.0, 0.0, 1.0]  # marker for tag nodes
-            node_features.append(tag_features)
+                for post in self.posts[:num_embedded]
+            ], dtype=torch.float)
         
-        # Convert to tensor
-        x = torch.tensor(node_features, dtype=torch.float)
-        
-        # Build edges
-        edge_list = []
+        # Tag node features (simple marker for tag nodes)
+        x[num_posts:, metadata] = torch.tensor([1.0, 0.0, 1.0])
         
         # 1. Post-tag edges
-        for post_idx, post in enumerate(self.posts):
-            for tag in post.get('extracted_tags', []):
-                if tag in self.tag_to_idx:
-                    tag_idx = self.tag_to_idx[tag]
-                    # Bidirectional edges
-                    edge_list.append([post_idx, tag_idx])
-                    edge_list.append([tag_idx, post_idx])
+        post_tag_pairs = np.array([
+            (post_idx, self.tag_to_idx[tag])
+            for post_idx, post in enumerate(self.posts)
+            for tag in post.get('extracted_tags', [])
+            if tag in self.tag_to_idx
+        ], dtype=np.int64).reshape(-1, 2)
         
         # 2. Post-post similarity edges (using embeddings)
-        if len(self.embeddings) >= 2:
-            embeddings_array = np.array(self.embeddings[:num_posts])
-            similarity_matrix = cosine_similarity(embeddings_array)
-            
-            for i in range(num_posts):
-                for j in range(i + 1, num_posts):
-                    if similarity_matrix[i][j] > similarity_threshold:
-                        edge_list.append([i, j])
-                        edge_list.append([j, i])
-        
-        # Convert edges to tensor
-        if edge_list:
-            edge_index = torch.tensor(edge_list, dtype=torch.long).t().contiguous()
+        post_post_pairs = self._similarity_pairs(
+            num_embedded, similarity_threshold, max_neighbors, chunk_size
+        )
+        
+        # Every undirected pair becomes two directed edges, kept adjacent
+        pairs = np.concatenate([post_tag_pairs, post_post_pairs])
+        if len(pairs) > 0:
+            edges = np.stack([pairs, pairs[:, ::-1]], axis=1).reshape(-1, 2)
+            edge_index = torch.from_numpy(np.ascontiguousarray(edges.T))
         else:
             # Create minimal graph if no edges found
             edge_index = torch.tensor([[0, 1], [1, 0]], dtype=torch.long).t().contiguous()
         
-        # Create PyTorch Geometric Data object
-        data = Data(x=x, edge_index=edge_index)
+        # Create PyTorch Geometric Data object (structural edges all weigh 1.0)
+        edge_weight = torch.ones(edge_index.shape[1], dtype=torch.float)
+        data = Data(x=x, edge_index=edge_index, edge_weight=edge_weight)
         
         print(f"Built graph with {total_nodes} nodes and {edge_index.shape[1]} edges")
         return data
+    
+    def _similarity_pairs(
+        self,
+        num_embedded: int,
+        similarity_threshold: float,
+        max_neighbors: Optional[int],
+        chunk_size: int
+    ) -> np.ndarray:
+        """Undirected (i, j) post pairs, i < j, whose cosine similarity passes the threshold"""
+        if num_embedded < 2:
+            return np.empty((0, 2), dtype=np.int64)
+        
+        embeddings = np.asarray(self.embeddings[:num_embedded], dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        normalized = embeddings / np.where(norms > 0, norms, 1.0)
+        
+        blocks = []
+        for start in range(0, num_embedded, chunk_size):
+            stop = min(start + chunk_size, num_embedded)
+            rows = np.arange(start, stop)
+            similarities = normalized[start:stop] @ normalized.T
+            
+            if max_neighbors is None:
+                # Upper triangle only, so each pair is found once
+                mask = np.triu(similarities > similarity_threshold, k=start + 1)
+                src, dst = np.nonzero(mask)
+                blocks.append(np.stack([src + start, dst], axis=1))
+            else:
+                similarities[np.arange(len(rows)), rows] = -np.inf
+                neighbors = top_k_indices(similarities, max_neighbors)
+                keep = np.take_along_axis(similarities, neighbors, axis=1) > similarity_threshold
+                src = np.broadcast_to(rows[:, None], neighbors.shape)[keep]
+                dst = neighbors[keep]
+                blocks.append(np.stack([np.minimum(src, dst), np.maximum(src, dst)], axis=1))
+        
+        pairs = np.concatenate(blocks)
+        if max_neighbors is not None and len(pairs) > 0:
+            # A pair chosen from both ends must only be emitted once
+            pairs = np.unique(pairs, axis=0)
+        return pairs.astype(np.int64)
 
 
 class SimpleGNNRecommender(torch.nn.Module):
@@ -171,19 +434,19 @@ class SimpleGNNRecommender(torch.nn.Module):
         self.conv3 = GCNConv(hidden_dim, output_dim)
         self.dropout = torch.nn.Dropout(0.2)
         
-    def forward(self, x, edge_index, batch=None):
+    def forward(self, x, edge_index, batch=None, edge_weight=None):
         # First GCN layer
-        x = self.conv1(x, edge_index)
+        x = self.conv1(x, edge_index, edge_weight)
         x = F.relu(x)
         x = self.dropout(x)
         
         # Second GCN layer
-        x = self.conv2(x, edge_index)
+        x = self.conv2(x, edge_index, edge_weight)
         x = F.relu(x)
         x = self.dropout(x)
         
         # Third GCN layer
-        x = self.conv3(x, edge_index)
+        x = self.conv3(x, edge_index, edge_weight)
         
         return x
 
@@ -191,11 +454,72 @@ class SimpleGNNRecommender(torch.nn.Module):
 class NeuralGraphRecommenderMVP:
     """Main MVP class for neural graph recommendations"""
     
-    def __init__(self, semantic_mapping_path: str, semantic_embeddings_path: str):
+    def __init__(
+        self,
+        semantic_mapping_path: str,
+        semantic_embeddings_path: str,
+        neighbor_index_k: int = 0,
+        cache_dir: Optional[str] = None,
+        graph_max_neighbors: Optional[int] = None,
+        use_checkpoint: bool = True,
+        graph_snapshot_path: Optional[str] = None
+    ):
+        """
+        Args:
+            semantic_mapping_path: Path to the post metadata JSON
+            semantic_embeddings_path: Path to the post embeddings JSON
+            neighbor_index_k: If > 0, precompute the top-K neighbors of every
+                post at initialize() and serve recommendations from that table
+            cache_dir: Directory for persisted artifacts (defaults to GNN_CACHE_DIR)
+            graph_max_neighbors: If set, bound post-post edges to each post's
+                most similar neighbors (see BlogPostGraphBuilder.build_graph)
+            use_checkpoint: Reuse (and save) the trained model and graph from
+                cache_dir when the inputs and hyperparameters are unchanged
+            graph_snapshot_path: Serve the graph from a snapshot written by
+                save_graph_snapshot (e.g. an exported learned graph) instead
+                of building it from the embeddings
+        """
         self.graph_builder = BlogPostGraphBuilder(semantic_mapping_path, semantic_embeddings_path)
         self.model = None
         self.graph_data = None
         self.is_initialized = False
+        self.cache_dir = cache_dir or DEFAULT_CACHE_DIR
+        
+        # Similarity index over the original post embeddings
+        self.embedding_matrix = None  # (num_posts, dim) float32, L2-normalized rows
+        self.embedding_norms = None  # (num_posts,) float32, 0 for missing embeddings
+        
+        # Optional precomputed top-K neighbor table (NEIGHBOR_INDEX_DTYPE, -1 = no neighbor)
+        self.neighbor_index_k = neighbor_index_k
+        self.neighbor_index = None
+        
+        self.graph_max_neighbors = graph_max_neighbors
+        
+        # Graph and training hyperparameters (part of the checkpoint key)
+        self.similarity_threshold = 0.3
+        self.hidden_dim = 128
+        self.output_dim = 64
+        self.train_epochs = 50
+        self.use_checkpoint = use_checkpoint
+        self.graph_snapshot_path = graph_snapshot_path
+        
+        # (edge_index, structural weight per edge) from a loaded graph snapshot;
+        # the real-time engine takes the structural/learned split from it
+        # while graph_data still holds that edge_index
+        self.graph_base_weight = None
+        
+        # Inference cache: bumped on every model/graph change, and the cached
+        # trending order is valid for one version only
+        self.model_version = 0
+        self.centrality = GraphCentrality()
+        self._ranked_posts = {}  # centrality method -> posts sorted by score
+        self._ranked_version = -1
+        
+        # Post metadata store: response dicts in corpus order, plus an id index
+        # (the first post wins when the mapping repeats an id)
+        self.post_details = {}
+        self._post_details_list = []
+        self._posts_payload = None  # (serialized /posts body, ETag)
         
     def initialize(self):
         """Initialize the recommender system"""
@@ -207,17 +531,43 @@ class NeuralGraphRecommenderMVP:
             # Extract tags
             self.graph_builder.extract_tags_from_posts()
             
-            # Build graph
-            self.graph_data = self.graph_builder.build_graph()
+            # Index post metadata by id for constant-time lookups
+            self._build_post_store()
+            
+            # Build the normalized embedding matrix used for similarity queries
+            self._build_similarity_index()
+            
+            # Precompute (or load) the all-pairs neighbor table if enabled
+            if self.neighbor_index_k > 0:
+                self._load_or_build_neighbor_index()
             
-            # Initialize model
-            input_dim = self.graph_data.x.shape[1]
-            self.model = SimpleGNNRecommender(input_dim)
+            # A warm restart reuses the trained model and graph as-is
+            checkpoint_loaded = self.use_checkpoint and self._load_checkpoint()
             
-            # Simple unsupervised training (node similarity)
-            self._train_model()
+            # An exported graph replaces the checkpointed or built one
+            snapshot_loaded = bool(self.graph_snapshot_path) and self._load_graph_snapshot()
+            
+            if not checkpoint_loaded:
+                # Build graph
+                if not snapshot_loaded:
+                    self.graph_data = self.graph_builder.build_graph(
+                        similarity_threshold=self.similarity_threshold,
+                        max_neighbors=self.graph_max_neighbors
+                    )
+                
+                # Initialize model
+                input_dim = self.graph_data.x.shape[1]
+                self.model = SimpleGNNRecommender(input_dim, self.hidden_dim, self.output_dim)
+                
+                # Simple unsupervised training (node similarity)
+                self._train_model(epochs=self.train_epochs)
+                
+                # Checkpoints are keyed by the source files, so they must hold the built graph
+                if self.use_checkpoint and not snapshot_loaded:
+                    self._save_checkpoint()
             
             self.is_initialized = True
+            self.mark_model_updated()
             print("Neural Graph Recommender MVP initialized successfully!")
             return True
             
@@ -225,18 +575,112 @@ class NeuralGraphRecommenderMVP:
             print(f"Error initializing recommender: {e}")
             return False
     
-    def _train_model(self, epochs: int = 50):
+    def _checkpoint_path(self) -> str:
+        """Cache path of the checkpoint for the current inputs and hyperparameters"""
+        key = content_hash(
+            self.graph_builder.source_paths(),
+            'checkpoint', CHECKPOINT_VERSION,
+            self.similarity_threshold, self.graph_max_neighbors,
+            self.hidden_dim, self.output_dim, self.train_epochs
+        )
+        return os.path.join(self.cache_dir, f"checkpoint-{key}.pt")
+    
+    def _save_checkpoint(self):
+        """Persist the trained model, graph tensors and tag index"""
+        path = self._checkpoint_path()
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = path + '.tmp'
+            torch.save({
+                'version': CHECKPOINT_VERSION,
+                'model_state': self.model.state_dict(),
+                'x': self.graph_data.x,
+                'edge_index': self.graph_data.edge_index,
+                'edge_weight': self.graph_data.edge_weight,
+                'tag_to_idx': self.graph_builder.tag_to_idx,
+            }, tmp_path)
+            os.replace(tmp_path, path)
+            print(f"Saved checkpoint to {path}")
+        except OSError as e:
+            print(f"Could not persist checkpoint: {e}")
+    
+    def _load_checkpoint(self) -> bool:
+        """Restore the model and graph from a matching checkpoint, if any"""
+        path = self._checkpoint_path()
+        if not os.path.exists(path):
+            return False
+        
+        try:
+            checkpoint = torch.load(path, weights_only=True)
+            
+            # Tags are re-extracted from the posts; they must line up with the saved graph
+            if checkpoint.get('tag_to_idx') != self.graph_builder.tag_to_idx:
+                print(f"Checkpoint {path} does not match the current tag index, retraining")
+                return False
+            
+            edge_weight = checkpoint.get('edge_weight')
+            if edge_weight is None:
+                edge_weight = torch.ones(checkpoint['edge_index'].shape[1], dtype=torch.float)
+            graph_data = Data(x=checkpoint['x'], edge_index=checkpoint['edge_index'], edge_weight=edge_weight)
+            model = SimpleGNNRecommender(graph_data.x.shape[1], self.hidden_dim, self.output_dim)
+            model.load_state_dict(checkpoint['model_state'])
+            
+            self.graph_data = graph_data
+            self.model = model
+            print(f"Loaded checkpoint from {path}")
+            return True
+            
+        except Exception as e:
+            print(f"Ignoring unreadable checkpoint {path}: {e}")
+            return False
+    
+    def _load_graph_snapshot(self) -> bool:
+        """Replace the graph with the one in graph_snapshot_path, if it fits these posts"""
+        path = self.graph_snapshot_path
+        try:
+            graph_data, post_ids, stats, base_weight = load_graph_snapshot(path)
+            
+            idx_to_post = self.graph_builder.idx_to_post
+            expected_ids = [idx_to_post[idx]['id'] for idx in range(len(idx_to_post))]
+            if post_ids != expected_ids:
+                print(f"Graph snapshot {path} was exported for different posts, ignoring it")
+                return False
+            if self.model is not None and graph_data.x.shape[1] != self.model.conv1.in_channels:
+                print(f"Graph snapshot {path} has {graph_data.x.shape[1]}-dim features, expected "
+                      f"{self.model.conv1.in_channels}, ignoring it")
+                return False
+            
+            self.graph_data = graph_data
+            self.graph_base_weight = (graph_data.edge_index, base_weight)
+            print(f"Loaded graph snapshot from {path} ({graph_data.edge_index.shape[1]} edges)")
+            return True
+            
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring unreadable graph snapshot {path}: {e}")
+            return False
+    
+    def _train_model(self, epochs: int = 50, num_negatives: int = 10):
         """Improved unsupervised training for the GNN model"""
         self.model.train()
         optimizer = torch.optim.Adam(self.model.parameters(), lr=0.01)
         
         num_posts = len(self.graph_builder.posts)
         
+        # Only consider post-to-post edges for similarity; the mask is fixed
+        # for the whole run, so compute it once
+        edge_index = self.graph_data.edge_index
+        post_edge_mask = (edge_index[0] < num_posts) & (edge_index[1] < num_posts)
+        pos_src, pos_dst = edge_index[:, post_edge_mask]
+        post_edge_keys = torch.unique(pos_src * num_posts + pos_dst)
+        num_negatives = min(len(pos_src), num_negatives)
+        
         for epoch in range(epochs):
             optimizer.zero_grad()
             
             # Forward pass
-            embeddings = self.model(self.graph_data.x, self.graph_data.edge_index)
+            embeddings = self.model(
+                self.graph_data.x, self.graph_data.edge_index, edge_weight=self.graph_data.edge_weight
+            )
             
             # Get post embeddings only
             post_embeddings = embeddings[:num_posts]
@@ -244,33 +688,15 @@ class NeuralGraphRecommenderMVP:
             # Contrastive learning approach
             # Positive pairs: connected nodes should be similar
             # Negative pairs: unconnected nodes should be different
-            edge_index = self.graph_data.edge_index
-            
-            # Only consider post-to-post edges for similarity
-            post_edges = []
-            for i in range(edge_index.shape[1]):
-                src, dst = edge_index[0][i].item(), edge_index[1][i].item()
-                if src < num_posts and dst < num_posts:  # Both are posts
-                    post_edges.append((src, dst))
-            
-            if post_edges:
+            if len(pos_src) > 0:
                 # Positive pairs (connected posts)
-                pos_src = torch.stack([post_embeddings[src] for src, _ in post_edges])
-                pos_dst = torch.stack([post_embeddings[dst] for _, dst in post_edges])
-                pos_similarity = F.cosine_similarity(pos_src, pos_dst)
+                pos_similarity = F.cosine_similarity(post_embeddings[pos_src], post_embeddings[pos_dst])
                 
                 # Negative pairs (random unconnected posts)
-                neg_pairs = []
-                for _ in range(min(len(post_edges), 10)):  # Sample some negative pairs
-                    src = torch.randint(0, num_posts, (1,)).item()
-                    dst = torch.randint(0, num_posts, (1,)).item()
-                    if src != dst and (src, dst) not in post_edges:
-                        neg_pairs.append((src, dst))
+                neg_src, neg_dst = sample_negative_pairs(num_posts, num_negatives, post_edge_keys)
                 
-                if neg_pairs:
-                    neg_src = torch.stack([post_embeddings[src] for src, _ in neg_pairs])
-                    neg_dst = torch.stack([post_embeddings[dst] for _, dst in neg_pairs])
-                    neg_similarity = F.cosine_similarity(neg_src, neg_dst)
+                if len(neg_src) > 0:
+                    neg_similarity = F.cosine_similarity(post_embeddings[neg_src], post_embeddings[neg_dst])
                     
                     # Contrastive loss: maximize positive similarity, minimize negative similarity
                     margin = 0.5
@@ -288,111 +714,293 @@ class NeuralGraphRecommenderMVP:
             if epoch % 10 == 0:
                 print(f"Training epoch {epoch}, Loss: {loss.item():.4f}")
     
-    def get_recommendations(self, post_id: str, num_recommendations: int = 5) -> List[Dict]:
-        """Get recommendations for a given blog post"""
-        if not self.is_initialized:
-            return []
+    def _build_similarity_index(self):
+        """Precompute the L2-normalized float32 embedding matrix for posts"""
+        num_posts = len(self.graph_builder.posts)
+        embeddings = self.graph_builder.embeddings[:num_posts]
+        dim = len(embeddings[0]) if len(embeddings) > 0 else 768
+        
+        # Posts without an embedding keep a zero row and never score above 0
+        matrix = np.zeros((num_posts, dim), dtype=np.float32)
+        if len(embeddings) > 0:
+            matrix[:len(embeddings)] = np.asarray(embeddings, dtype=np.float32)
+        
+        norms = np.linalg.norm(matrix, axis=1)
+        safe_norms = np.where(norms > 0, norms, 1.0).astype(np.float32)
+        
+        self.embedding_matrix = matrix / safe_norms[:, None]
+        self.embedding_norms = norms.astype(np.float32)
+        print(f"Built similarity index for {num_posts} posts ({dim} dims)")
+    
+    def _neighbor_index_path(self) -> str:
+        """Cache path of the neighbor index for the current input files"""
+        key = content_hash(self.graph_builder.source_paths(), 'neighbors', self.neighbor_index_k)
+        return os.path.join(self.cache_dir, f"neighbors-{key}.npy")
+    
+    def _load_or_build_neighbor_index(self):
+        """Load the persisted neighbor index, or compute and persist it"""
+        path = self._neighbor_index_path()
+        num_posts = len(self.graph_builder.posts)
+        
+        if os.path.exists(path):
+            try:
+                index = np.load(path)
+                if index.dtype == NEIGHBOR_INDEX_DTYPE and index.shape == (num_posts, self.neighbor_index_k):
+                    self.neighbor_index = index
+                    print(f"Loaded neighbor index from {path}")
+                    return
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable neighbor index {path}: {e}")
+        
+        self.neighbor_index = self._build_neighbor_index(self.neighbor_index_k)
         
         try:
-            # Get post index
-            if post_id not in self.graph_builder.post_to_idx:
-                return []
-            
-            post_idx = self.graph_builder.post_to_idx[post_id]
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                np.save(f, self.neighbor_index)
+            os.replace(tmp_path, path)
+            print(f"Saved neighbor index to {path}")
+        except OSError as e:
+            print(f"Could not persist neighbor index: {e}")
+    
+    def _build_neighbor_index(self, k: int, chunk_size: int = 1024) -> np.ndarray:
+        """Compute the top-k neighbors of every post, chunked over query rows"""
+        num_posts = self.embedding_matrix.shape[0]
+        index = np.empty((num_posts, k), dtype=NEIGHBOR_INDEX_DTYPE)
+        index['ids'] = -1
+        index['scores'] = 0
+        
+        width = min(k, num_posts - 1)
+        for start in range(0, num_posts, chunk_size):
+            rows = np.arange(start, min(start + chunk_size, num_posts))
+            similarities = self.embedding_matrix[rows] @ self.embedding_matrix.T
+            similarities[np.arange(len(rows)), rows] = -np.inf
+            
+            top_indices = top_k_indices(similarities, width)
+            index['ids'][rows, :width] = top_indices
+            index['scores'][rows, :width] = np.take_along_axis(similarities, top_indices, axis=1)
+        
+        # Posts without an embedding have no meaningful neighbors
+        index['ids'][self.embedding_norms == 0] = -1
+        
+        print(f"Built neighbor index with top-{k} neighbors for {num_posts} posts")
+        return index
+    
+    def _format_recommendation(self, idx: int, score: float) -> Dict:
+        """Format a post node as a recommendation dict"""
+        post = self.graph_builder.idx_to_post[idx]
+        return {
+            'id': post['id'],
+            'title': post.get('title', 'Untitled'),
+            'url': post.get('url', ''),
+            'excerpt': post.get('excerpt', ''),
+            'score': float(score),
+            'tags': post.get('extracted_tags', [])
+        }
+    
+    def get_batch_recommendations(
+        self,
+        post_ids: List[str],
+        num_recommendations: int = 5,
+        timings: Optional[Dict[str, float]] = None
+    ) -> Dict[str, List[Dict]]:
+        """Get recommendations for many posts with a single matrix product
+        
+        Unknown post ids and posts without an embedding map to an empty list.
+        If a ``timings`` dict is passed, it is filled with the milliseconds
+        spent resolving ids, scoring and formatting results.
+        """
+        results = {post_id: [] for post_id in post_ids}
+        if not self.is_initialized or self.embedding_matrix is None:
+            return results
+        
+        try:
+            start = time.perf_counter()
+            
+            # Resolve the queries that can actually be scored
+            query_ids = []
+            query_indices = []
+            for post_id in results:
+                post_idx = self.graph_builder.post_to_idx.get(post_id)
+                if post_idx is None or self.embedding_norms[post_idx] == 0:
+                    continue
+                query_ids.append(post_id)
+                query_indices.append(post_idx)
+            
+            resolved = time.perf_counter()
+            if timings is not None:
+                timings['resolve_ms'] = (resolved - start) * 1000
+            
+            if not query_indices:
+                return results
+            
+            # Serve straight from the precomputed table when it is deep enough
+            if self.neighbor_index is not None and num_recommendations <= self.neighbor_index_k:
+                for post_id, post_idx in zip(query_ids, query_indices):
+                    row = self.neighbor_index[post_idx, :num_recommendations]
+                    results[post_id] = [
+                        self._format_recommendation(int(idx), score)
+                        for idx, score in zip(row['ids'], row['scores'])
+                        if idx >= 0
+                    ]
+                
+                if timings is not None:
+                    timings['lookup_ms'] = (time.perf_counter() - resolved) * 1000
+                
+                return results
             
-            # Use original embeddings for content-based similarity (more reliable)
-            if post_idx >= len(self.graph_builder.embeddings):
-                return []
+            # Cosine similarity of every query against every post in one pass
+            query_indices = np.asarray(query_indices, dtype=np.int64)
+            similarities = self.embedding_matrix[query_indices] @ self.embedding_matrix.T
             
-            # Calculate content-based similarities using original embeddings
-            original_embedding = np.array(self.graph_builder.embeddings[post_idx])
-            num_posts = len(self.graph_builder.posts)
+            # Exclude each query post from its own results
+            rows = np.arange(len(query_indices))
+            similarities[rows, query_indices] = -np.inf
             
-            similarities = []
-            for i in range(num_posts):
-                if i < len(self.graph_builder.embeddings):
-                    other_embedding = np.array(self.graph_builder.embeddings[i])
-                    # Cosine similarity
-                    similarity = np.dot(original_embedding, other_embedding) / (np.linalg.norm(original_embedding) * np.linalg.norm(other_embedding))
-                    similarities.append(similarity)
-                else:
-                    similarities.append(0.0)
+            num_posts = similarities.shape[1]
+            k = min(num_recommendations, num_posts - 1)
+            top_indices = top_k_indices(similarities, k)
             
-            similarities = np.array(similarities)
+            scored = time.perf_counter()
             
-            # Get top recommendations (excluding the input post)
-            similarities[post_idx] = -1  # Exclude self
-            top_indices = np.argsort(similarities)[::-1][:num_recommendations]
+            for row, post_id in enumerate(query_ids):
+                results[post_id] = [
+                    self._format_recommendation(int(idx), similarities[row, idx])
+                    for idx in top_indices[row]
+                ]
             
-            # Format recommendations
-            recommendations = []
-            for idx in top_indices:
-                if idx < num_posts:  # Ensure it's a post node
-                    post = self.graph_builder.idx_to_post[idx]
-                    recommendations.append({
-                        'id': post['id'],
-                        'title': post.get('title', 'Untitled'),
-                        'url': post.get('url', ''),
-                        'excerpt': post.get('excerpt', ''),
-                        'score': float(similarities[idx]),
-                        'tags': post.get('extracted_tags', [])
-                    })
+            if timings is not None:
+                timings['similarity_ms'] = (scored - resolved) * 1000
+                timings['format_ms'] = (time.perf_counter() - scored) * 1000
             
-            return recommendations
+            return results
             
         except Exception as e:
-            print(f"Error getting recommendations: {e}")
+            print(f"Error getting batch recommendations: {e}")
+            return {post_id: [] for post_id in post_ids}
+    
+    def get_recommendations(self, post_id: str, num_recommendations: int = 5) -> List[Dict]:
+        """Get recommendations for a given blog post"""
+        if not self.is_initialized:
             return []
+        
+        return self.get_batch_recommendations([post_id], num_recommendations).get(post_id, [])
     
-
+    def mark_model_updated(self):
+        """Recompute cached inference after the model or graph changed
+        
+        The version is bumped only once the new caches are in place, so
+        readers keep getting the previous results while this runs.
+        """
+        version = self.model_version + 1
+        self.refresh_inference_cache(version)
+        self.model_version = version
     
-    def get_all_posts_with_scores(self) -> List[Dict]:
-        """Get all posts with their centrality scores for trending analysis"""
+    def refresh_inference_cache(self, version: Optional[int] = None):
+        """Run one forward pass and cache the trending order per method"""
         if not self.is_initialized:
-            return []
+            return
         
         try:
+            if version is None:
+                version = self.model_version
+            
             self.model.eval()
             with torch.no_grad():
-                embeddings = self.model(self.graph_data.x, self.graph_data.edge_index)
+                embeddings = self.model(
+                    self.graph_data.x, self.graph_data.edge_index, edge_weight=self.graph_data.edge_weight
+                )
             
-            # Calculate node centrality (simple approach: embedding magnitude)
             num_posts = len(self.graph_builder.posts)
-            post_embeddings = embeddings[:num_posts]
-            centrality_scores = torch.norm(post_embeddings, dim=1)
-            
-            posts_with_scores = []
-            for idx, post in enumerate(self.graph_builder.posts):
-                posts_with_scores.append({
-                    'id': post['id'],
-                    'title': post.get('title', 'Untitled'),
-                    'url': post.get('url', ''),
-                    'excerpt': post.get('excerpt', ''),
-                    'centrality_score': centrality_scores[idx].item(),
-                    'tags': post.get('extracted_tags', [])
-                })
-            
-            # Sort by centrality score
-            posts_with_scores.sort(key=lambda x: x['centrality_score'], reverse=True)
-            return posts_with_scores
+            
+            # 'gnn' centrality is the magnitude of the learned embedding;
+            # the graph metrics come from sparse power iteration (warm-started)
+            scores_by_method = {
+                'gnn': torch.norm(embeddings[:num_posts], dim=1).numpy()
+            }
+            graph_scores = self.centrality.compute(
+                self.graph_data.edge_index,
+                self.graph_data.x.shape[0],
+                self.graph_data.edge_weight
+            )
+            for method, scores in graph_scores.items():
+                scores_by_method[method] = scores[:num_posts]
+            
+            ranked_posts = {}
+            for method, scores in scores_by_method.items():
+                scores = scores.tolist()
+                posts_with_scores = []
+                for idx, post in enumerate(self.graph_builder.posts):
+                    posts_with_scores.append({
+                        'id': post['id'],
+                        'title': post.get('title', 'Untitled'),
+                        'url': post.get('url', ''),
+                        'excerpt': post.get('excerpt', ''),
+                        'centrality_score': scores[idx],
+                        'tags': post.get('extracted_tags', [])
+                    })
+                
+                # Sort by centrality score
+                posts_with_scores.sort(key=lambda x: x['centrality_score'], reverse=True)
+                ranked_posts[method] = posts_with_scores
+            
+            self._ranked_posts = ranked_posts
+            self._ranked_version = version
             
         except Exception as e:
-            print(f"Error getting post scores: {e}")
+            print(f"Error refreshing inference cache: {e}")
+    
+    def get_all_posts_with_scores(self, limit: Optional[int] = None, method: str = 'gnn') -> List[Dict]:
+        """Get all posts with their centrality scores for trending analysis
+        
+        Served from the presorted list cached for the current model version.
+        ``method`` is 'gnn' (embedding magnitude) or one of GraphCentrality.METHODS.
+        """
+        if not self.is_initialized:
             return []
+        
+        if self._ranked_version < self.model_version:
+            self.refresh_inference_cache()
+        
+        return self._ranked_posts.get(method, [])[:limit]
+    
+    def _build_post_store(self):
+        """Precompute the public metadata dict of every post, keyed by id"""
+        self._post_details_list = [
+            {
+                'id': post['id'],
+                'title': post.get('title', 'Untitled'),
+                'url': post.get('url', ''),
+                'excerpt': post.get('excerpt', ''),
+                'tags': post.get('extracted_tags', [])
+            }
+            for post in self.graph_builder.posts
+        ]
+        self.post_details = {}
+        for details in self._post_details_list:
+            self.post_details.setdefault(details['id'], details)
+        self._posts_payload = None
     
     def get_post_details(self, post_id: str) -> Optional[Dict]:
         """Get details for a specific post"""
-        if not self.graph_builder or not self.graph_builder.posts:
-            return None
-        
-        for post in self.graph_builder.posts:
-            if post.get('id') == post_id:
-                return {
-                    'id': post['id'],
-                    'title': post.get('title', 'Untitled'),
-                    'url': post.get('url', ''),
-                    'excerpt': post.get('excerpt', ''),
-                    'tags': post.get('extracted_tags', [])
-                }
-        
-        return None
\ No newline at end of file
+        details = self.post_details.get(post_id)
+        return dict(details) if details is not None else None
+    
+    def get_all_post_details(self) -> List[Dict]:
+        """Get the metadata of every post, in corpus order"""
+        return list(self._post_details_list)
+    
+    def get_posts_payload(self) -> Tuple[bytes, str]:
+        """Serialized /posts response body and its ETag, built once per post store"""
+        if self._posts_payload is None:
+            posts = self.get_all_post_details()
+            body = json.dumps({
+                'posts': posts,
+                'success': True,
+                'message': f"Retrieved {len(posts)} blog posts"
+            }).encode('utf-8')
+            etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+            self._posts_payload = (body, etag)
+        
+        return self._posts_payload
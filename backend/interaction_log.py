@@ -0,0 +1,247 @@
+"""
+Durable Interaction Log for the Real-time Learning Engine
+Append-only, segment-rotated binary log of user interactions with batched fsync
+"""
+
+import os
+import re
+import json
+import time
+import zlib
+import struct
+from typing import Dict, Iterator, List, Optional, Tuple
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Every segment starts with this magic (the trailing byte is the format version)
+SEGMENT_MAGIC = b"GNNILOG\x01"
+
+# Record header: payload length, CRC32 of the payload, unix time it was logged
+RECORD_HEADER = struct.Struct("<IId")
+
+SEGMENT_PATTERN = re.compile(r"^segment-(\d{8})\.log$")
+
+
+class InteractionLog:
+    """Append-only interaction log split into numbered segment files
+    
+    Records are length-prefixed compact JSON behind a fixed-width header
+    carrying a CRC, so a torn write at the tail of a segment is detected on
+    replay and the rest of that segment skipped. Writes go to the OS buffer
+    immediately; fsync is batched (every sync_every records, every
+    sync_interval seconds of appends, on explicit sync(), rotation and close).
+    
+    Every open starts a fresh segment, so appends never follow a torn tail.
+    Compaction is driven by the owner: rotate() seals the active segment,
+    the owner persists a snapshot covering everything up to that segment and
+    then calls drop_segments_through() to delete what the snapshot folded in.
+    
+    Not thread-safe; callers serialize access (the engine uses one writer
+    thread). total_bytes() only reads a counter and may be called from anywhere.
+    """
+    
+    def __init__(
+        self,
+        log_dir: str,
+        segment_max_bytes: int = 8 * 1024 * 1024,
+        sync_every: int = 256,
+        sync_interval: float = 1.0
+    ):
+        """
+        Initialize the interaction log
+        
+        Args:
+            log_dir: Directory holding segment files (created if missing)
+            segment_max_bytes: Size after which the active segment is rotated
+            sync_every: Unsynced records that force an fsync
+            sync_interval: Seconds after which the next append forces an fsync
+        """
+        self.log_dir = log_dir
+        self.segment_max_bytes = segment_max_bytes
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        
+        os.makedirs(log_dir, exist_ok=True)
+        
+        # Running size of all segments, kept current by appends and drops so
+        # callers can check it without touching the filesystem
+        self._total_bytes = sum(os.path.getsize(self.segment_path(segment)) for segment in self.segments())
+        
+        # Active segment, opened lazily on the first append
+        self._file = None
+        self._segment = None
+        self._segment_bytes = 0
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        
+        # Sequence numbers only grow, even after compaction deletes every segment
+        self._next_segment = 0
+    
+    def segments(self) -> List[int]:
+        """Sequence numbers of the segment files on disk, oldest first"""
+        numbers = []
+        for name in os.listdir(self.log_dir):
+            match = SEGMENT_PATTERN.match(name)
+            if match:
+                numbers.append(int(match.group(1)))
+        return sorted(numbers)
+    
+    def segment_path(self, segment: int) -> str:
+        """Path of the segment file with this sequence number"""
+        return os.path.join(self.log_dir, f"segment-{segment:08d}.log")
+    
+    def append(self, interactions: List[Dict], logged_at: Optional[float] = None):
+        """
+        Append interactions to the active segment
+        
+        Args:
+            interactions: Interaction dictionaries (must be JSON serializable)
+            logged_at: Unix time stored with the records (defaults to now)
+        """
+        if not interactions:
+            return
+        
+        if self._file is None:
+            self._open_segment()
+        
+        logged_at = time.time() if logged_at is None else logged_at
+        chunks = []
+        for interaction in interactions:
+            payload = json.dumps(interaction, separators=(",", ":"), default=str).encode("utf-8")
+            chunks.append(RECORD_HEADER.pack(len(payload), zlib.crc32(payload), logged_at))
+            chunks.append(payload)
+        
+        data = b"".join(chunks)
+        self._file.write(data)
+        self._segment_bytes += len(data)
+        self._total_bytes += len(data)
+        self._unsynced += len(interactions)
+        
+        if self._segment_bytes >= self.segment_max_bytes:
+            self.rotate()
+        elif (self._unsynced >= self.sync_every
+              or time.monotonic() - self._last_sync >= self.sync_interval):
+            self.sync()
+    
+    def sync(self):
+        """Flush and fsync the active segment if it has unsynced records"""
+        if self._file is None or self._unsynced == 0:
+            return
+        
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+    
+    def rotate(self) -> Optional[int]:
+        """
+        Seal the active segment; the next append opens a new one
+        
+        Returns:
+            Sequence number of the sealed segment, or None if none was open
+        """
+        if self._file is None:
+            return None
+        
+        self.sync()
+        self._file.close()
+        sealed = self._segment
+        self._file = None
+        self._segment = None
+        return sealed
+    
+    def close(self):
+        """Sync and close the active segment"""
+        self.rotate()
+    
+    def advance_past(self, segment: int):
+        """
+        Make new segments number after a sequence already folded into a snapshot
+        
+        Args:
+            segment: Highest sequence number the caller has accounted for
+        """
+        self._next_segment = max(self._next_segment, segment + 1)
+    
+    def total_bytes(self) -> int:
+        """Size of all segments on disk (the active one as of its last write)"""
+        return self._total_bytes
+    
+    def drop_segments_through(self, segment: int) -> int:
+        """
+        Delete sealed segments up to and including a sequence number
+        
+        Args:
+            segment: Last sequence number to delete
+        
+        Returns:
+            Number of segment files removed
+        """
+        removed = 0
+        for number in self.segments():
+            if number <= segment and number != self._segment:
+                path = self.segment_path(number)
+                size = os.path.getsize(path)
+                os.remove(path)
+                self._total_bytes -= size
+                removed += 1
+        return removed
+    
+    def replay(self, after_segment: int = -1) -> Iterator[Tuple[float, Dict]]:
+        """
+        Read logged interactions back in append order
+        
+        Args:
+            after_segment: Only segments with a higher sequence number are read
+        
+        Yields:
+            (logged_at unix time, interaction) tuples
+        """
+        for segment in self.segments():
+            if segment <= after_segment or segment == self._segment:
+                continue
+            yield from self._read_segment(segment)
+    
+    def _read_segment(self, segment: int) -> Iterator[Tuple[float, Dict]]:
+        """Records of one segment, stopping at the first torn or corrupt record"""
+        path = self.segment_path(segment)
+        with open(path, "rb") as f:
+            if f.read(len(SEGMENT_MAGIC)) != SEGMENT_MAGIC:
+                logger.warning(f"Skipping {path}: not an interaction log segment")
+                return
+            
+            while True:
+                header = f.read(RECORD_HEADER.size)
+                if not header:
+                    return
+                if len(header) < RECORD_HEADER.size:
+                    logger.warning(f"Truncated record header at the end of {path}")
+                    return
+                
+                length, checksum, logged_at = RECORD_HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != checksum:
+                    logger.warning(f"Torn or corrupt record in {path}; skipping the rest of the segment")
+                    return
+                
+                yield logged_at, json.loads(payload)
+    
+    def _open_segment(self):
+        """Start a new segment after the highest existing sequence number"""
+        existing = self.segments()
+        self._segment = max([self._next_segment] + [number + 1 for number in existing[-1:]])
+        self._next_segment = self._segment + 1
+        self._file = open(self.segment_path(self._segment), "xb")
+        self._file.write(SEGMENT_MAGIC)
+        self._segment_bytes = len(SEGMENT_MAGIC)
+        self._total_bytes += len(SEGMENT_MAGIC)
+        
+        # Make the new directory entry durable along with the data
+        dir_fd = os.open(self.log_dir, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
@@ -6,14 +6,20 @@ Enables online graph updates and continuous learning from user interactions
 import torch
 import torch.nn.functional as F
 from torch_geometric.data import Data
+from torch_geometric.utils import k_hop_subgraph
 import numpy as np
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
-from collections import deque, defaultdict
+from collections import deque
 import asyncio
 import json
+import os
+import time
 import logging
-from threading import Lock
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from graph_recommender import SimpleGNNRecommender, save_graph_snapshot, signal_feature_columns
+from interaction_log import InteractionLog
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -22,30 +28,113 @@ logger = logging.getLogger(__name__)
 class RealtimeLearningEngine:
     """Handles real-time graph updates and online learning"""
     
-    def __init__(self, base_recommender, update_interval: int = 300):
+    def __init__(self, base_recommender, update_interval: int = 300, log_dir: Optional[str] = None):
         """
         Initialize real-time learning engine
         
         Args:
             base_recommender: Base NeuralGraphRecommenderMVP instance
-            update_interval: Interval between model updates in seconds
+            update_interval: Maximum seconds an interaction waits before an
+                update includes it (the scheduler's max-latency trigger)
+            log_dir: Directory for the durable interaction log and its snapshot
+                (None keeps interactions in memory only)
         """
         self.base_recommender = base_recommender
         self.update_interval = update_interval
         
-        # Interaction buffers
+        # Update scheduling: an update runs once update_threshold new
+        # interactions arrived, or once the oldest pending one has waited
+        # update_interval seconds, and never with nothing new. Updates are
+        # spaced at least min_update_interval apart, stretched to
+        # update_cost_ratio times the last update's duration and doubled while
+        # the ingest queue is over half full, so training backs off under load.
+        self.min_update_interval = 30.0
+        self.update_cost_ratio = 10.0
+        self._events_since_update = 0
+        self._first_pending_at = None  # time.monotonic() of the oldest unapplied interaction
+        self._last_update_finished = time.monotonic()
+        self._last_update_duration = 0.0
+        self._update_wakeup = None  # asyncio.Event, created by start()
+        
+        # Durable interaction log, replayed by start() to rebuild graph state.
+        # Appends run on a single writer thread, which keeps them ordered and
+        # off the event loop; once the log outgrows compact_threshold_bytes an
+        # update folds it into a snapshot of the learned graph state.
+        self.interaction_log = InteractionLog(log_dir) if log_dir else None
+        self.snapshot_path = os.path.join(log_dir, "snapshot.npz") if log_dir else None
+        self.compact_threshold_bytes = 32 * 1024 * 1024
+        self._log_writer = None
+        
+        # Ingestion queue: record_interaction only enqueues, and a consumer
+        # task drains it in batches (created by start() on the running loop)
+        self.ingest_queue = None
+        self.ingest_queue_size = 10000
+        self.ingest_batch_size = 256
+        self._loop = None
+        
+        # Interaction buffers; interaction_buffer holds the interactions not
+        # yet fine-tuned on (each update drains it, so training only sees new
+        # ones), dropping the oldest past maxlen
         self.interaction_buffer = deque(maxlen=1000)
         self.edge_update_buffer = []
-        self.node_feature_updates = defaultdict(list)
+        
+        # Feature proposals as flat indices into graph_data.x plus values;
+        # each update applies their per-cell mean in one scatter
+        self.feature_update_index = []
+        self.feature_update_values = []
         
         # Learning parameters
         self.learning_rate = 0.001
         self.batch_size = 32
-        self.update_threshold = 50  # Minimum interactions before update
+        self.update_threshold = 50  # New interactions that trigger an update right away
+        self.finetune_steps = 5  # Gradient steps (one random mini-batch each) per update
+        self.finetune_loss = 'pairwise'  # 'pairwise', 'margin' or 'infonce'
+        self.loss_margin = 0.5  # Negatives only penalized above this similarity ('margin', 'infonce')
+        self.infonce_temperature = 0.1
+        
+        # Named signal -> node feature column it accumulates into; signals
+        # not in the registry are ignored. Defaults to the dedicated columns
+        # the graph builder reserves (graph_recommender.SIGNAL_FEATURES).
+        graph_data = base_recommender.graph_data
+        self.feature_columns = signal_feature_columns(graph_data.x.shape[1]) if graph_data is not None else {}
+        self.feature_update_scale = 0.1  # Mean signal value is scaled by this before being added
+        
+        # Fine-tuning only sees this many hops around the nodes in the training
+        # pairs: one more than the GCN depth, so every node that feeds a touched
+        # node's embedding still sees its full degree
+        self.finetune_num_hops = 4
+        
+        # Adam moment estimates carried across updates (a state_dict, since
+        # the optimizer itself lives in the training worker)
+        self._optimizer_state = None
         
-        # Thread safety
-        self.buffer_lock = Lock()
-        self.model_lock = Lock()
+        # Edge weighting: interaction weight decays with this half-life, and
+        # learned edges whose weight falls below the threshold are pruned
+        self.edge_decay_half_life = 7 * 24 * 3600  # seconds
+        self.edge_prune_threshold = 0.05
+        
+        # Per-edge state aligned with graph_data.edge_index, which this engine
+        # keeps coalesced in sorted src * num_nodes + dst key order. Edges the
+        # engine finds in the graph are structural (base weight, never pruned),
+        # except for the learned part of a loaded graph snapshot; the state is
+        # rebuilt whenever edge_index is replaced elsewhere.
+        self._edge_keys = None
+        self._edge_keys_for = None
+        self._base_weight = None
+        self._interaction_weight = None
+        self._last_decay = None
+        
+        # Serializes model updates; an asyncio.Lock created on first use, since
+        # the engine may be constructed outside the event loop. Buffers are only
+        # touched from the event loop once started.
+        self.model_lock = None
+        
+        # Fine-tuning runs in a worker process against a snapshot; new weights
+        # are loaded into the shadow model, which is then swapped in
+        self.use_process_pool = True
+        self._training_executor = None
+        self._shadow_model = None
+        self._shadow_config = None
         
         # Statistics
         self.stats = {
@@ -53,49 +142,136 @@ class RealtimeLearningEngine:
             'model_updates': 0,
             'last_update': None,
             'edge_additions': 0,
-            'feature_updates': 0
+            'edges_pruned': 0,
+            'feature_updates': 0,
+            'dropped_interactions': 0,
+            'replayed_interactions': 0,
+            'log_compactions': 0,
+            'skipped_updates': 0
         }
         
         # Start background update task
         self.update_task = None
+        self.ingest_task = None
         self.is_running = False
         
     async def start(self):
         """Start the real-time learning engine"""
+        self._loop = asyncio.get_running_loop()
+        
+        if self.interaction_log is not None:
+            self._log_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="interaction-log")
+            await self._loop.run_in_executor(self._log_writer, self._replay_log)
+            
+        self.ingest_queue = asyncio.Queue(maxsize=self.ingest_queue_size)
+        self._update_wakeup = asyncio.Event()
         self.is_running = True
+        self.ingest_task = asyncio.create_task(self._ingest_loop())
         self.update_task = asyncio.create_task(self._periodic_update_loop())
         logger.info("Real-time learning engine started")
         
     async def stop(self):
         """Stop the real-time learning engine"""
         self.is_running = False
-        if self.update_task:
-            self.update_task.cancel()
+        for task in (self.update_task, self.ingest_task):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+                    
+        # Process whatever was still queued
+        if self.ingest_queue is not None:
+            self._process_interaction_batch(self._drain_queue())
+            
+        if self._log_writer is not None:
+            self._log_writer.submit(self.interaction_log.close)
+            self._log_writer.shutdown(wait=True)
+            self._log_writer = None
+            
+        if self._training_executor is not None:
+            self._training_executor.shutdown(wait=False)
+            self._training_executor = None
+        logger.info("Real-time learning engine stopped")
+        
+    async def _ingest_loop(self):
+        """Consume queued interactions in batches and turn them into graph/feature proposals"""
+        while self.is_running:
             try:
-                await self.update_task
+                batch = [await self.ingest_queue.get()]
+                batch.extend(self._drain_queue(self.ingest_batch_size - 1))
+                self._process_interaction_batch(batch)
+                
+                # Group commit: fsync once traffic pauses rather than per record
+                if self._log_writer is not None and self.ingest_queue.empty():
+                    self._log_writer.submit(self.interaction_log.sync)
+                
             except asyncio.CancelledError:
-                pass
-        logger.info("Real-time learning engine stopped")
+                break
+            except Exception as e:
+                logger.error(f"Error in interaction ingest loop: {e}")
+                
+    def _drain_queue(self, limit: Optional[int] = None) -> List[Dict]:
+        """Take up to limit interactions off the queue without waiting"""
+        batch = []
+        while (limit is None or len(batch) < limit) and not self.ingest_queue.empty():
+            batch.append(self.ingest_queue.get_nowait())
+        return batch
         
     async def _periodic_update_loop(self):
-        """Periodically update the model with accumulated interactions"""
+        """Run model updates whenever the scheduler's triggers fire"""
         while self.is_running:
             try:
-                await asyncio.sleep(self.update_interval)
+                await self._wait_for_update_trigger()
+                await self.update_model()
                 
-                # Check if we have enough interactions
-                if len(self.interaction_buffer) >= self.update_threshold:
-                    await self.update_model()
-                    
             except asyncio.CancelledError:
                 break
             except Exception as e:
                 logger.error(f"Error in periodic update loop: {e}")
                 
-    def record_interaction(self, interaction: Dict):
+    async def _wait_for_update_trigger(self):
+        """Wait until enough new interactions arrived or the oldest one has waited too long"""
+        while True:
+            now = time.monotonic()
+            earliest = self._last_update_finished + self._min_update_spacing()
+            
+            if self._events_since_update >= self.update_threshold:
+                due = earliest
+            elif self._events_since_update > 0:
+                due = max(earliest, self._first_pending_at + self.update_interval)
+            else:
+                due = None  # Nothing new: sleep until an interaction arrives
+                
+            if due is not None and now >= due:
+                return
+                
+            self._update_wakeup.clear()
+            try:
+                await asyncio.wait_for(self._update_wakeup.wait(), None if due is None else due - now)
+            except asyncio.TimeoutError:
+                pass
+                
+    def _min_update_spacing(self) -> float:
+        """Seconds to leave between updates, widened by update cost and ingest backlog"""
+        spacing = max(self.min_update_interval, self.update_cost_ratio * self._last_update_duration)
+        if self.ingest_queue is not None and self.ingest_queue.qsize() > self.ingest_queue_size // 2:
+            spacing *= 2
+        return min(spacing, self.update_interval)
+        
+    def has_pending_changes(self) -> bool:
+        """Whether any interaction arrived since the last update"""
+        return self._events_since_update > 0 or bool(self.edge_update_buffer) or bool(self.feature_update_index)
+        
+    def record_interaction(self, interaction: Dict) -> bool:
         """
         Record a user interaction for learning
         
+        Once the engine is started this only enqueues the interaction and
+        returns immediately; the ingest task does the processing. Before
+        start() (scripts, tests) it is processed synchronously.
+        
         Args:
             interaction: Dictionary containing interaction details
                 - user_id: User identifier
@@ -103,12 +279,57 @@ class RealtimeLearningEngine:
                 - action: Type of interaction (view, click, like, share, etc.)
                 - timestamp: When the interaction occurred
                 - context: Additional context (source_post, search_query, etc.)
+                
+        Returns:
+            False if the interaction was dropped because the queue is full
+            (hand-offs from other threads are counted in stats instead)
         """
-        with self.buffer_lock:
-            # Add timestamp if not present
-            if 'timestamp' not in interaction:
-                interaction['timestamp'] = datetime.now().isoformat()
+        # Add timestamp if not present
+        if 'timestamp' not in interaction:
+            interaction['timestamp'] = datetime.now().isoformat()
+            
+        if self.ingest_queue is None:
+            self._process_interaction_batch([interaction])
+            return True
+            
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+            
+        if running_loop is not self._loop:
+            # Called off the engine's loop: hand over without touching the queue here
+            self._loop.call_soon_threadsafe(self._enqueue, interaction)
+            return True
+            
+        return self._enqueue(interaction)
+        
+    def _enqueue(self, interaction: Dict) -> bool:
+        """Put an interaction on the ingest queue, dropping it when full"""
+        try:
+            self.ingest_queue.put_nowait(interaction)
+            return True
+        except asyncio.QueueFull:
+            self.stats['dropped_interactions'] += 1
+            return False
+            
+    def _process_interaction_batch(self, interactions: List[Dict]):
+        """Log and buffer a batch of interactions and derive graph/feature proposals"""
+        self._log_interactions(interactions)
+        
+        if interactions:
+            if self._events_since_update == 0:
+                self._first_pending_at = time.monotonic()
+            self._events_since_update += len(interactions)
             
+            # Wake the scheduler to arm the latency timer or fire the count trigger
+            if self._update_wakeup is not None and (
+                self._events_since_update == len(interactions)
+                or self._events_since_update >= self.update_threshold
+            ):
+                self._update_wakeup.set()
+                
+        for interaction in interactions:
             # Add to buffer
             self.interaction_buffer.append(interaction)
             self.stats['total_interactions'] += 1
@@ -116,10 +337,27 @@ class RealtimeLearningEngine:
             # Process interaction for graph updates
             self._process_interaction_for_graph(interaction)
             
-            logger.debug(f"Recorded interaction: {interaction['action']} on {interaction['post_id']}")
+        logger.debug(f"Processed {len(interactions)} interactions")
+        
+    def _log_interactions(self, interactions: List[Dict]):
+        """Append interactions to the durable log (on the writer thread once started)"""
+        if self.interaction_log is None or not interactions:
+            return
             
-    def _process_interaction_for_graph(self, interaction: Dict):
-        """Process interaction to determine graph updates"""
+        if self._log_writer is not None:
+            self._log_writer.submit(self._append_to_log, interactions, time.time())
+        else:
+            self._append_to_log(interactions, time.time())
+            
+    def _append_to_log(self, interactions: List[Dict], logged_at: float):
+        """Write interactions to the log, logging rather than raising on I/O errors"""
+        try:
+            self.interaction_log.append(interactions, logged_at)
+        except Exception as e:
+            logger.error(f"Error appending {len(interactions)} interactions to the log: {e}")
+            
+    def _process_interaction_for_graph(self, interaction: Dict, timestamp: Optional[datetime] = None):
+        """Process interaction to determine graph updates (timestamp defaults to now)"""
         action = interaction.get('action')
         post_id = interaction.get('post_id')
         context = interaction.get('context', {})
@@ -128,13 +366,13 @@ class RealtimeLearningEngine:
         if action in ['click', 'view'] and 'source_post' in context:
             # User navigated from one post to another
             source_post = context['source_post']
-            self._propose_edge_update(source_post, post_id, weight=0.5)
+            self._propose_edge_update(source_post, post_id, weight=0.5, timestamp=timestamp)
             
         elif action in ['like', 'share']:
             # Strong positive signal - boost connections
             if 'related_posts' in context:
                 for related_post in context['related_posts']:
-                    self._propose_edge_update(post_id, related_post, weight=0.8)
+                    self._propose_edge_update(post_id, related_post, weight=0.8, timestamp=timestamp)
                     
         elif action == 'search_click':
             # User clicked on search result
@@ -142,7 +380,7 @@ class RealtimeLearningEngine:
                 # Update post features based on search relevance
                 self._propose_feature_update(post_id, 'search_relevance', 1.0)
                 
-    def _propose_edge_update(self, source: str, target: str, weight: float):
+    def _propose_edge_update(self, source: str, target: str, weight: float, timestamp: Optional[datetime] = None):
         """Propose a new edge or edge weight update"""
         # Get node indices
         source_idx = self.base_recommender.graph_builder.post_to_idx.get(source)
@@ -153,117 +391,397 @@ class RealtimeLearningEngine:
                 'source': source_idx,
                 'target': target_idx,
                 'weight': weight,
-                'timestamp': datetime.now()
+                'timestamp': timestamp or datetime.now()
             })
             
     def _propose_feature_update(self, post_id: str, feature: str, value: float):
-        """Propose a node feature update"""
+        """Propose a node feature update for a registered signal"""
         post_idx = self.base_recommender.graph_builder.post_to_idx.get(post_id)
+        column = self.feature_columns.get(feature)
         
-        if post_idx is not None:
-            self.node_feature_updates[post_idx].append({
-                'feature': feature,
-                'value': value,
-                'timestamp': datetime.now()
-            })
+        if post_idx is not None and column is not None:
+            num_features = self.base_recommender.graph_data.x.shape[1]
+            self.feature_update_index.append(post_idx * num_features + column)
+            self.feature_update_values.append(value)
+            
+    async def update_model(self, force: bool = False) -> bool:
+        """
+        Update the model with accumulated interactions
+        
+        Args:
+            force: Run even if no interaction arrived since the last update
+            
+        Returns:
+            False if the update was skipped because nothing changed, or failed
+            (its pending interactions are then kept for the next update)
+        """
+        if self.model_lock is None:
+            self.model_lock = asyncio.Lock()
+            
+        async with self.model_lock:
+            if not force and not self.has_pending_changes():
+                self.stats['skipped_updates'] += 1
+                logger.info("Skipping model update: no new interactions")
+                return False
+                
+            started = time.monotonic()
+            
+            # Take the pending work; swapping in fresh buffers is atomic with
+            # respect to the ingest task, which runs on the same loop. Each
+            # part is cleared once applied, so a failure hands back only what
+            # was not (re-applying edge or feature updates would double them).
+            pending = {
+                'events': self._events_since_update,
+                'first_pending_at': self._first_pending_at,
+                'interactions': list(self.interaction_buffer),
+                'edge_updates': self.edge_update_buffer,
+                'feature_index': self.feature_update_index,
+                'feature_values': self.feature_update_values
+            }
+            self._events_since_update = 0
+            self._first_pending_at = None
+            self.interaction_buffer.clear()
+            self.edge_update_buffer = []
+            self.feature_update_index = []
+            self.feature_update_values = []
             
-    async def update_model(self):
-        """Update the model with accumulated interactions"""
-        with self.model_lock:
             try:
                 logger.info("Starting model update...")
                 
-                # Get current interactions
-                with self.buffer_lock:
-                    interactions = list(self.interaction_buffer)
-                    edge_updates = self.edge_update_buffer.copy()
-                    feature_updates = dict(self.node_feature_updates)
-                    
-                    # Clear buffers
-                    self.edge_update_buffer.clear()
-                    self.node_feature_updates.clear()
-                
-                # Update graph structure
-                if edge_updates:
-                    self._update_graph_edges(edge_updates)
+                # Update graph structure (also decays and prunes learned edges)
+                num_edge_updates = len(pending['edge_updates'])
+                edges_added = self._update_graph_edges(pending['edge_updates'])
+                pending['edge_updates'] = []
                     
                 # Update node features
-                if feature_updates:
-                    self._update_node_features(feature_updates)
+                updated_nodes = self._update_node_features(pending['feature_index'], pending['feature_values'])
+                pending['feature_index'], pending['feature_values'] = [], []
+                    
+                # The graph state now reflects every interaction logged before
+                # the buffer swap; capture it before any await lets more arrive
+                compacting = (
+                    self._log_writer is not None
+                    and self.interaction_log.total_bytes() >= self.compact_threshold_bytes
+                )
+                if compacting:
+                    sealed = self._log_writer.submit(self._seal_log_for_compaction)
+                    snapshot = self._graph_state_snapshot()
+                    
+                # Fine-tune model on the interactions since the last update
+                await self._finetune_model(pending['interactions'])
+                pending['interactions'] = []
                     
-                # Fine-tune model
-                if interactions:
-                    await self._finetune_model(interactions)
+                # Recompute cached embeddings and trending scores for the new model
+                # off the event loop; the caches are replaced in one assignment
+                await asyncio.get_running_loop().run_in_executor(
+                    None, self.base_recommender.mark_model_updated
+                )
+                    
+                if compacting:
+                    await self._compact_log(await asyncio.wrap_future(sealed), snapshot)
                     
                 # Update statistics
                 self.stats['model_updates'] += 1
                 self.stats['last_update'] = datetime.now().isoformat()
-                self.stats['edge_additions'] += len(edge_updates)
-                self.stats['feature_updates'] += len(feature_updates)
+                self.stats['edge_additions'] += edges_added
+                self.stats['feature_updates'] += updated_nodes
                 
-                logger.info(f"Model update completed. Edges: {len(edge_updates)}, Features: {len(feature_updates)}")
+                logger.info(
+                    f"Model update completed. Edge updates: {num_edge_updates} "
+                    f"({edges_added} new edges), Features: {updated_nodes}"
+                )
+                return True
                 
             except Exception as e:
                 logger.error(f"Error updating model: {e}")
+                self._restore_pending(pending)
+                return False
                 
-    def _update_graph_edges(self, edge_updates: List[Dict]):
-        """Update graph edges based on interactions"""
-        if not self.base_recommender.graph_data:
-            return
+            finally:
+                self._last_update_finished = time.monotonic()
+                self._last_update_duration = self._last_update_finished - started
+                
+    def _restore_pending(self, pending: Dict):
+        """Put the unapplied part of a failed update back ahead of newer work"""
+        self.interaction_buffer = deque(
+            pending['interactions'] + list(self.interaction_buffer),
+            maxlen=self.interaction_buffer.maxlen
+        )
+        self.edge_update_buffer = pending['edge_updates'] + self.edge_update_buffer
+        self.feature_update_index = pending['feature_index'] + self.feature_update_index
+        self.feature_update_values = pending['feature_values'] + self.feature_update_values
+        
+        # Count the events as pending again so the scheduler retries them,
+        # with the latency timer still running from the oldest one
+        if pending['events']:
+            self._events_since_update += pending['events']
+            self._first_pending_at = min(
+                at for at in (pending['first_pending_at'], self._first_pending_at) if at is not None
+            )
             
-        current_edges = self.base_recommender.graph_data.edge_index
-        new_edges = []
+    def _replay_log(self):
+        """Rebuild learned graph state from the snapshot and the log segments after it"""
+        through_segment = self._load_snapshot()
+        self.interaction_log.advance_past(through_segment)
         
-        for update in edge_updates:
-            source = update['source']
-            target = update['target']
+        replayed = 0
+        for logged_at, interaction in self.interaction_log.replay(after_segment=through_segment):
+            self._process_interaction_for_graph(interaction, timestamp=datetime.fromtimestamp(logged_at))
+            replayed += 1
             
-            # Check if edge already exists
-            edge_exists = False
-            for i in range(current_edges.shape[1]):
-                if (current_edges[0, i] == source and current_edges[1, i] == target):
-                    edge_exists = True
-                    break
-                    
-            if not edge_exists:
-                new_edges.append([source, target])
-                new_edges.append([target, source])  # Bidirectional
+        if replayed:
+            edge_updates, self.edge_update_buffer = self.edge_update_buffer, []
+            feature_index, self.feature_update_index = self.feature_update_index, []
+            feature_values, self.feature_update_values = self.feature_update_values, []
+            self._update_graph_edges(edge_updates)
+            self._update_node_features(feature_index, feature_values)
                 
-        if new_edges:
-            # Add new edges to graph
-            new_edge_tensor = torch.tensor(new_edges, dtype=torch.long).t()
-            self.base_recommender.graph_data.edge_index = torch.cat(
-                [current_edges, new_edge_tensor], dim=1
+        if replayed or through_segment >= 0:
+            self.base_recommender.mark_model_updated()
+            
+        self.stats['replayed_interactions'] = replayed
+        logger.info(f"Replayed {replayed} logged interactions (snapshot through segment {through_segment})")
+        
+    def _post_ids(self) -> np.ndarray:
+        """Post id of every graph node, in node order"""
+        idx_to_post = self.base_recommender.graph_builder.idx_to_post
+        return np.array([idx_to_post[idx]['id'] for idx in range(len(idx_to_post))])
+        
+    def _graph_state_snapshot(self) -> Dict:
+        """Copy of the learned graph state, safe to serialize while updates continue"""
+        self._sync_edge_state()
+        return {
+            'post_ids': self._post_ids(),
+            'edge_keys': self._edge_keys.copy(),
+            'base_weight': self._base_weight.copy(),
+            'interaction_weight': self._interaction_weight.copy(),
+            'last_decay': np.float64(self._last_decay.timestamp()),
+            'x': self.base_recommender.graph_data.x.numpy().copy()
+        }
+        
+    def _seal_log_for_compaction(self) -> Optional[int]:
+        """Rotate the log (on the writer thread) and return the last sealed segment"""
+        self.interaction_log.rotate()
+        segments = self.interaction_log.segments()
+        return segments[-1] if segments else None
+        
+    async def _compact_log(self, through_segment: Optional[int], snapshot: Dict):
+        """Persist the snapshot, then drop the segments it folds in"""
+        if through_segment is None:
+            return
+            
+        try:
+            removed = await asyncio.get_running_loop().run_in_executor(
+                self._log_writer, self._write_snapshot, snapshot, through_segment
             )
-            logger.info(f"Added {len(new_edges)} new edges to graph")
+            self.stats['log_compactions'] += 1
+            logger.info(f"Compacted {removed} log segments into {self.snapshot_path}")
+        except Exception as e:
+            logger.error(f"Error compacting interaction log: {e}")
             
-    def _update_node_features(self, feature_updates: Dict[int, List[Dict]]):
-        """Update node features based on interactions"""
-        if not self.base_recommender.graph_data:
+    def _write_snapshot(self, snapshot: Dict, through_segment: int) -> int:
+        """Atomically replace the snapshot file and delete the folded segments"""
+        temp_path = self.snapshot_path + ".tmp"
+        with open(temp_path, "wb") as f:
+            np.savez(f, through_segment=np.int64(through_segment), **snapshot)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.snapshot_path)
+        
+        return self.interaction_log.drop_segments_through(through_segment)
+        
+    def _load_snapshot(self) -> int:
+        """
+        Restore learned graph state from the snapshot file
+        
+        Returns:
+            Last log segment folded into the snapshot, or -1 if none was restored
+        """
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return -1
+            
+        with np.load(self.snapshot_path) as snapshot:
+            through_segment = int(snapshot['through_segment'])
+            post_ids = snapshot['post_ids']
+            edge_keys = snapshot['edge_keys']
+            base_weight = snapshot['base_weight']
+            
+            # Node indices are only meaningful for the same posts in the same
+            # order, and structural edges must match the graph being served
+            self._sync_edge_state()
+            structural = base_weight > 0
+            served_structural = self._base_weight > 0
+            if not (
+                snapshot['x'].shape == tuple(self.base_recommender.graph_data.x.shape)
+                and np.array_equal(post_ids, self._post_ids())
+                and np.array_equal(edge_keys[structural], self._edge_keys[served_structural])
+                and np.allclose(base_weight[structural], self._base_weight[served_structural])
+            ):
+                logger.warning(
+                    f"Ignoring {self.snapshot_path}: it was taken on a different graph; "
+                    f"interactions folded into it are lost"
+                )
+                return through_segment
+                
+            self._edge_keys = edge_keys
+            self._base_weight = base_weight
+            self._interaction_weight = snapshot['interaction_weight']
+            self._last_decay = datetime.fromtimestamp(float(snapshot['last_decay']))
+            self.base_recommender.graph_data.x = torch.from_numpy(snapshot['x'])
+            
+        self._publish_edges()
+        logger.info(f"Restored learned graph state from {self.snapshot_path}")
+        return through_segment
+        
+    def _sync_edge_state(self):
+        """Coalesce graph_data edges into sorted-key order and rebuild per-edge state if stale"""
+        graph_data = self.base_recommender.graph_data
+        if self._edge_keys is not None and self._edge_keys_for is graph_data.edge_index:
             return
             
-        for node_idx, updates in feature_updates.items():
-            if node_idx < self.base_recommender.graph_data.x.shape[0]:
-                # Aggregate feature updates
-                feature_deltas = {}
-                for update in updates:
-                    feature = update['feature']
-                    value = update['value']
-                    
-                    if feature not in feature_deltas:
-                        feature_deltas[feature] = []
-                    feature_deltas[feature].append(value)
-                    
-                # Apply aggregated updates
-                for feature, values in feature_deltas.items():
-                    # Simple averaging for now
-                    avg_value = np.mean(values)
-                    
-                    # Update specific feature dimensions
-                    if feature == 'search_relevance':
-                        # Update last few dimensions as search signal
-                        self.base_recommender.graph_data.x[node_idx, -3:] += avg_value * 0.1
-                        
+        num_nodes = graph_data.x.shape[0]
+        edges = graph_data.edge_index.numpy().astype(np.int64)
+        edge_weight = getattr(graph_data, 'edge_weight', None)
+        if edge_weight is not None:
+            weights = edge_weight.numpy().astype(np.float64)
+        else:
+            weights = np.ones(edges.shape[1], dtype=np.float64)
+            
+        # A loaded graph snapshot says which part of each weight is structural;
+        # otherwise every edge found in the graph is
+        base_weights = weights
+        snapshot_split = getattr(self.base_recommender, 'graph_base_weight', None)
+        if snapshot_split is not None and snapshot_split[0] is graph_data.edge_index:
+            base_weights = np.minimum(snapshot_split[1].astype(np.float64), weights)
+            
+        # Duplicate edges merge into one edge carrying the summed weight,
+        # which GCN normalization treats identically
+        keys, inverse = np.unique(edges[0] * num_nodes + edges[1], return_inverse=True)
+        total_weight = np.zeros(len(keys), dtype=np.float64)
+        np.add.at(total_weight, inverse, weights)
+        base_weight = np.zeros(len(keys), dtype=np.float64)
+        np.add.at(base_weight, inverse, base_weights)
+        
+        self._edge_keys = keys
+        self._base_weight = base_weight
+        self._interaction_weight = total_weight - base_weight
+        self._last_decay = datetime.now()
+        self._publish_edges()
+        
+    def _publish_edges(self):
+        """Write the per-edge state back to graph_data.edge_index / edge_weight"""
+        graph_data = self.base_recommender.graph_data
+        num_nodes = graph_data.x.shape[0]
+        
+        graph_data.edge_index = torch.from_numpy(
+            np.stack([self._edge_keys // num_nodes, self._edge_keys % num_nodes])
+        )
+        graph_data.edge_weight = torch.from_numpy(
+            (self._base_weight + self._interaction_weight).astype(np.float32)
+        )
+        self._edge_keys_for = graph_data.edge_index
+        
+    def _decay_factor(self, age_seconds):
+        """Multiplier applied to interaction weight after age_seconds"""
+        return np.power(0.5, np.maximum(age_seconds, 0.0) / self.edge_decay_half_life)
+        
+    def _update_graph_edges(self, edge_updates: List[Dict]) -> int:
+        """
+        Accumulate decayed interaction weights onto graph edges and prune stale ones
+        
+        Returns:
+            Number of edges inserted (proposals for existing edges only add weight)
+        """
+        if not self.base_recommender.graph_data:
+            return 0
+            
+        self._sync_edge_state()
+        graph_data = self.base_recommender.graph_data
+        num_nodes = graph_data.x.shape[0]
+        now = datetime.now()
+        
+        # Decay existing interaction weight since the last update
+        elapsed = (now - self._last_decay).total_seconds()
+        self._interaction_weight *= self._decay_factor(elapsed)
+        self._last_decay = now
+        
+        sources = np.fromiter((update['source'] for update in edge_updates), dtype=np.int64, count=len(edge_updates))
+        targets = np.fromiter((update['target'] for update in edge_updates), dtype=np.int64, count=len(edge_updates))
+        ages = np.fromiter(
+            ((now - update.get('timestamp', now)).total_seconds() for update in edge_updates),
+            dtype=np.float64, count=len(edge_updates)
+        )
+        weights = np.fromiter((update['weight'] for update in edge_updates), dtype=np.float64, count=len(edge_updates))
+        weights *= self._decay_factor(ages)
+        
+        # Bidirectional proposals, without self-loops (GCNConv adds its own)
+        keep = sources != targets
+        proposal_keys = np.concatenate([
+            sources[keep] * num_nodes + targets[keep],
+            targets[keep] * num_nodes + sources[keep]
+        ])
+        proposal_weights = np.concatenate([weights[keep], weights[keep]])
+        
+        # Insert edges not yet in the graph in one vectorized pass
+        # (binary search into the sorted keys, O(U log E) with no re-sort)
+        candidate_keys = np.unique(proposal_keys)
+        positions = np.searchsorted(self._edge_keys, candidate_keys)
+        exists = np.zeros(len(candidate_keys), dtype=bool)
+        in_range = positions < len(self._edge_keys)
+        exists[in_range] = self._edge_keys[positions[in_range]] == candidate_keys[in_range]
+        new_keys = candidate_keys[~exists]
+        
+        if len(new_keys) > 0:
+            insert_at = positions[~exists]
+            self._edge_keys = np.insert(self._edge_keys, insert_at, new_keys)
+            self._base_weight = np.insert(self._base_weight, insert_at, 0.0)
+            self._interaction_weight = np.insert(self._interaction_weight, insert_at, 0.0)
+            
+        # Repeated interactions strengthen the same edge
+        np.add.at(self._interaction_weight, np.searchsorted(self._edge_keys, proposal_keys), proposal_weights)
+        
+        # Learned edges that have decayed below the threshold are dropped
+        stale = (self._base_weight == 0) & (self._interaction_weight < self.edge_prune_threshold)
+        num_pruned = int(stale.sum())
+        if num_pruned:
+            self._edge_keys = self._edge_keys[~stale]
+            self._base_weight = self._base_weight[~stale]
+            self._interaction_weight = self._interaction_weight[~stale]
+            self.stats['edges_pruned'] += num_pruned
+            
+        self._publish_edges()
+        
+        if len(new_keys) > 0 or num_pruned:
+            logger.info(f"Added {len(new_keys)} new edges to graph, pruned {num_pruned} stale edges")
+            
+        return len(new_keys)
+            
+    def _update_node_features(self, feature_index: List[int], feature_values: List[float]) -> int:
+        """
+        Add the scaled mean of the proposed values to each targeted feature cell
+        
+        Args:
+            feature_index: Flat indices into graph_data.x (row * num_features + column)
+            feature_values: Proposed value for each index
+            
+        Returns:
+            Number of distinct nodes updated
+        """
+        graph_data = self.base_recommender.graph_data
+        if not graph_data or not feature_index:
+            return 0
+            
+        index = torch.tensor(feature_index, dtype=torch.long)
+        values = torch.tensor(feature_values, dtype=graph_data.x.dtype)
+        
+        # Scatter-mean per cell, then one index_add_ into the flattened features
+        cells, inverse = torch.unique(index, return_inverse=True)
+        sums = torch.zeros(len(cells), dtype=values.dtype).index_add_(0, inverse, values)
+        counts = torch.zeros(len(cells), dtype=values.dtype).index_add_(0, inverse, torch.ones_like(values))
+        graph_data.x.view(-1).index_add_(0, cells, sums / counts * self.feature_update_scale)
+        
+        return len(torch.unique(cells // graph_data.x.shape[1]))
+        
     async def _finetune_model(self, interactions: List[Dict]):
         """Fine-tune the GNN model based on interactions"""
         if not self.base_recommender.model or not interactions:
@@ -305,96 +823,271 @@ class RealtimeLearningEngine:
             if not positive_pairs and not negative_pairs:
                 return
                 
-            # Perform mini-batch gradient descent
-            self.base_recommender.model.train()
-            optimizer = torch.optim.Adam(
-                self.base_recommender.model.parameters(),
-                lr=self.learning_rate
+            # Train against a snapshot of just the region around the touched
+            # nodes, so serving keeps using the live model and cost tracks the
+            # changed part of the graph
+            model = self.base_recommender.model
+            subgraph = self._training_subgraph(
+                torch.tensor(positive_pairs, dtype=torch.long).reshape(-1, 2),
+                torch.tensor(negative_pairs, dtype=torch.long).reshape(-1, 2)
             )
+            snapshot = {
+                'model_state': {key: value.detach().clone() for key, value in model.state_dict().items()},
+                'model_config': self._model_config(),
+                'optimizer_state': self._optimizer_state,
+                **subgraph,
+                'learning_rate': self.learning_rate,
+                'batch_size': self.batch_size,
+                'steps': self.finetune_steps,
+                'loss': self.finetune_loss,
+                'margin': self.loss_margin,
+                'temperature': self.infonce_temperature
+            }
             
-            # Create batch
-            batch_size = min(self.batch_size, len(positive_pairs) + len(negative_pairs))
+            new_state, self._optimizer_state = await asyncio.get_running_loop().run_in_executor(
+                self._get_training_executor(), finetune_model_weights, snapshot
+            )
             
-            for _ in range(5):  # Few epochs of fine-tuning
-                # Sample batch
-                if positive_pairs:
-                    pos_batch = positive_pairs[:batch_size//2]
-                else:
-                    pos_batch = []
-                    
-                if negative_pairs:
-                    neg_batch = negative_pairs[:batch_size//2]
-                else:
-                    neg_batch = []
-                    
-                # Forward pass
-                embeddings = self.base_recommender.model(
-                    self.base_recommender.graph_data.x,
-                    self.base_recommender.graph_data.edge_index
-                )
-                
-                # Compute loss
-                loss = 0
-                
-                # Positive pairs - should be similar
-                for source_idx, target_idx in pos_batch:
-                    similarity = F.cosine_similarity(
-                        embeddings[source_idx].unsqueeze(0),
-                        embeddings[target_idx].unsqueeze(0)
-                    )
-                    loss += (1 - similarity).mean()
-                    
-                # Negative pairs - should be dissimilar
-                for source_idx, target_idx in neg_batch:
-                    similarity = F.cosine_similarity(
-                        embeddings[source_idx].unsqueeze(0),
-                        embeddings[target_idx].unsqueeze(0)
-                    )
-                    loss += similarity.mean()
-                    
-                if loss > 0:
-                    # Backward pass
-                    optimizer.zero_grad()
-                    loss.backward()
-                    optimizer.step()
-                    
-            self.base_recommender.model.eval()
-            logger.info(f"Fine-tuned model with {len(positive_pairs)} positive and {len(negative_pairs)} negative pairs")
+            self._publish_model(new_state)
+            self.stats['last_finetune_nodes'] = len(subgraph['x'])
+            logger.info(
+                f"Fine-tuned model with {len(positive_pairs)} positive and {len(negative_pairs)} negative pairs "
+                f"on a {len(subgraph['x'])}-node subgraph"
+            )
             
         except Exception as e:
             logger.error(f"Error fine-tuning model: {e}")
+            raise
+            
+    def _training_subgraph(self, positive_pairs: torch.Tensor, negative_pairs: torch.Tensor) -> Dict:
+        """k-hop subgraph around the nodes in the training pairs, with pairs relabeled into it"""
+        graph_data = self.base_recommender.graph_data
+        num_nodes = graph_data.x.shape[0]
+        touched = torch.unique(torch.cat([positive_pairs.flatten(), negative_pairs.flatten()]))
+        
+        subset, edge_index, _, edge_mask = k_hop_subgraph(
+            touched, self.finetune_num_hops, graph_data.edge_index,
+            relabel_nodes=True, num_nodes=num_nodes
+        )
+        
+        node_map = torch.full((num_nodes,), -1, dtype=torch.long)
+        node_map[subset] = torch.arange(len(subset))
+        
+        edge_weight = graph_data.edge_weight
+        return {
+            'x': graph_data.x[subset],
+            'edge_index': edge_index,
+            'edge_weight': edge_weight[edge_mask] if edge_weight is not None else None,
+            'positive_pairs': node_map[positive_pairs],
+            'negative_pairs': node_map[negative_pairs]
+        }
+        
+    def _model_config(self) -> Dict:
+        """Constructor arguments of the live model"""
+        model = self.base_recommender.model
+        return {
+            'input_dim': model.conv1.in_channels,
+            'hidden_dim': model.conv1.out_channels,
+            'output_dim': model.conv3.out_channels
+        }
+        
+    def _get_training_executor(self):
+        """Lazily create the fine-tuning executor (a spawned process, or a thread as fallback)"""
+        if self._training_executor is None:
+            if self.use_process_pool:
+                try:
+                    # spawn: forking a process that already runs torch threads can deadlock
+                    self._training_executor = ProcessPoolExecutor(
+                        max_workers=1, mp_context=multiprocessing.get_context('spawn')
+                    )
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Process pool unavailable, fine-tuning in a thread: {e}")
+            if self._training_executor is None:
+                self._training_executor = ThreadPoolExecutor(max_workers=1)
+        return self._training_executor
+        
+    def _publish_model(self, model_state: Dict[str, torch.Tensor]):
+        """Load new weights into the shadow model and swap it in atomically"""
+        config = self._model_config()
+        shadow = self._shadow_model
+        if shadow is None or self._shadow_config != config:
+            shadow = SimpleGNNRecommender(**config)
             
+        shadow.load_state_dict(model_state)
+        shadow.eval()
+        
+        # One reference assignment: readers see either the old or the new model
+        self._shadow_model, self.base_recommender.model = self.base_recommender.model, shadow
+        self._shadow_config = config
+        
     def get_learning_stats(self) -> Dict:
         """Get real-time learning statistics"""
         return {
             **self.stats,
             'buffer_size': len(self.interaction_buffer),
+            'queued_interactions': self.ingest_queue.qsize() if self.ingest_queue is not None else 0,
             'pending_edge_updates': len(self.edge_update_buffer),
-            'pending_feature_updates': sum(
-                len(updates) for updates in self.node_feature_updates.values()
-            )
+            'pending_feature_updates': len(self.feature_update_index),
+            'events_since_update': self._events_since_update
         }
         
     def export_learned_graph(self, filepath: str):
-        """Export the updated graph structure"""
+        """
+        Export the updated graph structure
+        
+        Writes a binary .npz snapshot (see graph_recommender.save_graph_snapshot)
+        that NeuralGraphRecommenderMVP can load via graph_snapshot_path; a path
+        ending in .json keeps the legacy edge-list JSON.
+        
+        Args:
+            filepath: Destination file
+        """
         if not self.base_recommender.graph_data:
             return False
             
         try:
-            graph_data = {
-                'edge_index': self.base_recommender.graph_data.edge_index.tolist(),
-                'num_nodes': self.base_recommender.graph_data.x.shape[0],
-                'num_edges': self.base_recommender.graph_data.edge_index.shape[1],
-                'stats': self.stats,
-                'timestamp': datetime.now().isoformat()
-            }
+            graph_data = self.base_recommender.graph_data
             
-            with open(filepath, 'w') as f:
-                json.dump(graph_data, f, indent=2)
+            if filepath.endswith('.json'):
+                with open(filepath, 'w') as f:
+                    json.dump({
+                        'edge_index': graph_data.edge_index.tolist(),
+                        'num_nodes': graph_data.x.shape[0],
+                        'num_edges': graph_data.edge_index.shape[1],
+                        'stats': self.stats,
+                        'timestamp': datetime.now().isoformat()
+                    }, f)
+            else:
+                # Keep the structural/learned split so a recommender serving
+                # the snapshot still decays and prunes the learned edges
+                self._sync_edge_state()
+                save_graph_snapshot(filepath, graph_data, self._post_ids().tolist(), {
+                    **self.stats,
+                    'num_nodes': graph_data.x.shape[0],
+                    'num_edges': graph_data.edge_index.shape[1],
+                    'timestamp': datetime.now().isoformat()
+                }, base_weight=self._base_weight)
                 
             logger.info(f"Exported learned graph to {filepath}")
             return True
             
         except Exception as e:
             logger.error(f"Error exporting graph: {e}")
-            return False
\ No newline at end of file
+            return False
+
+def _random_minibatches(num_items: int, batch_size: int, steps: int) -> List[torch.Tensor]:
+    """Index batches for each step, walking fresh random permutations (epochs) of the items"""
+    if num_items == 0 or batch_size == 0:
+        return [torch.empty(0, dtype=torch.long) for _ in range(steps)]
+        
+    # Enough shuffled epochs to cover every step, laid end to end
+    needed = steps * batch_size
+    order = torch.cat([torch.randperm(num_items) for _ in range(-(-needed // num_items))])
+    return list(order[:needed].view(steps, batch_size))
+    
+    
+def contrastive_loss(
+    embeddings: torch.Tensor,
+    pos_batch: torch.Tensor,
+    neg_batch: torch.Tensor,
+    loss_type: str = 'pairwise',
+    margin: float = 0.5,
+    temperature: float = 0.1
+) -> torch.Tensor:
+    """
+    Loss over (source, target) index pairs, with one batched similarity call per pair set
+    
+    Args:
+        embeddings: Node embeddings from the model
+        pos_batch: (P, 2) pairs that should be similar
+        neg_batch: (N, 2) pairs that should be dissimilar
+        loss_type: 'pairwise' sums (1 - sim) over positives and sim over
+            negatives; 'margin' averages them and only penalizes negatives
+            above the margin; 'infonce' scores each positive against the other
+            targets in the batch as negatives, plus the margin term for
+            explicit negatives
+        margin: Similarity above which explicit negatives are penalized
+        temperature: Softmax temperature for 'infonce'
+    """
+    loss = embeddings.new_zeros(())
+    
+    if len(pos_batch) > 0:
+        sources = embeddings[pos_batch[:, 0]]
+        targets = embeddings[pos_batch[:, 1]]
+        if loss_type == 'infonce':
+            logits = F.normalize(sources, dim=1) @ F.normalize(targets, dim=1).t() / temperature
+            loss = loss + F.cross_entropy(logits, torch.arange(len(pos_batch)))
+        else:
+            pos_similarity = F.cosine_similarity(sources, targets)
+            if loss_type == 'margin':
+                loss = loss + (1 - pos_similarity).mean()
+            else:
+                loss = loss + (1 - pos_similarity).sum()
+                
+    if len(neg_batch) > 0:
+        neg_similarity = F.cosine_similarity(embeddings[neg_batch[:, 0]], embeddings[neg_batch[:, 1]])
+        if loss_type in ('margin', 'infonce'):
+            loss = loss + torch.clamp(neg_similarity - margin, min=0).mean()
+        else:
+            loss = loss + neg_similarity.sum()
+            
+    return loss
+    
+    
+def finetune_model_weights(snapshot: Dict) -> Tuple[Dict[str, torch.Tensor], Dict]:
+    """
+    Fine-tune a copy of the model on a graph snapshot (runs in the training worker)
+    
+    Each step draws a random mini-batch of up to batch_size // 2 positive and
+    batch_size // 2 negative pairs, cycling through shuffled epochs of the
+    pairs, so cost scales with the number of steps rather than pairs.
+    
+    Args:
+        snapshot: Model state/config, graph tensors, training pairs and
+            hyperparameters, as assembled by RealtimeLearningEngine._finetune_model
+            
+    Returns:
+        The updated model state_dict and optimizer state_dict
+    """
+    model = SimpleGNNRecommender(**snapshot['model_config'])
+    model.load_state_dict(snapshot['model_state'])
+    
+    x = snapshot['x']
+    edge_index = snapshot['edge_index']
+    edge_weight = snapshot['edge_weight']
+    positive_pairs = snapshot['positive_pairs']
+    negative_pairs = snapshot['negative_pairs']
+    steps = snapshot['steps']
+    
+    # Perform mini-batch gradient descent, resuming Adam's moment estimates
+    model.train()
+    optimizer = torch.optim.Adam(model.parameters(), lr=snapshot['learning_rate'])
+    if snapshot.get('optimizer_state'):
+        optimizer.load_state_dict(snapshot['optimizer_state'])
+        for group in optimizer.param_groups:
+            group['lr'] = snapshot['learning_rate']
+    
+    half_batch = max(snapshot['batch_size'] // 2, 1)
+    pos_batches = _random_minibatches(len(positive_pairs), min(half_batch, len(positive_pairs)), steps)
+    neg_batches = _random_minibatches(len(negative_pairs), min(half_batch, len(negative_pairs)), steps)
+    
+    for pos_indices, neg_indices in zip(pos_batches, neg_batches):
+        # Forward pass
+        embeddings = model(x, edge_index, edge_weight=edge_weight)
+        
+        loss = contrastive_loss(
+            embeddings,
+            positive_pairs[pos_indices],
+            negative_pairs[neg_indices],
+            loss_type=snapshot['loss'],
+            margin=snapshot['margin'],
+            temperature=snapshot['temperature']
+        )
+        
+        # Backward pass
+        optimizer.zero_grad()
+        loss.backward()
+        optimizer.step()
+        
+    model.eval()
+    return model.state_dict(), optimizer.state_dict()
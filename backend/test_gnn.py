@@ -6,11 +6,25 @@ Run this to verify the system works with your existing blog data
 
 import sys
 import os
+import json
+import time
+import asyncio
+import math
+import tempfile
+from datetime import date, datetime, timedelta, timezone
+from types import SimpleNamespace
+import numpy as np
+import torch
+from torch_geometric.data import Data
 
 # Add the backend directory to the path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from graph_recommender import NeuralGraphRecommenderMVP
+from graph_recommender import NeuralGraphRecommenderMVP, load_graph_snapshot
+from ga4_rollups import EVENT_BITS, SETTLE_DAYS, GA4RollupStore, table_suffix
+from analytics_integration import EnhancedGraphRecommender, GA4BehaviorAnalyzer
+from interaction_log import InteractionLog
+from realtime_learning import RealtimeLearningEngine
 
 def test_gnn_mvp():
     """Test the GNN MVP functionality"""
@@ -75,6 +89,15 @@ def test_gnn_mvp():
         else:
             print(f"   ⚠️  No recommendations found")
     
+    # Test batched recommendations
+    print(f"\n📦 Testing Batch Recommendations:")
+    batch = recommender.get_batch_recommendations(test_posts, num_recommendations=3)
+    for post_id in test_posts:
+        single = [rec['id'] for rec in recommender.get_recommendations(post_id, num_recommendations=3)]
+        batched = [rec['id'] for rec in batch.get(post_id, [])]
+        status = "✅" if single == batched else "❌"
+        print(f"   {status} {post_id}: {len(batched)} recommendations")
+    
     # Test trending posts
     print(f"\n🔥 Testing Trending Posts:")
     trending = recommender.get_all_posts_with_scores()
@@ -98,6 +121,373 @@ def test_gnn_mvp():
     
     return True
 
+def _check(label, passed):
+    """Print a pass/fail line for one check and return whether it passed"""
+    print(f"   {'✅' if passed else '❌'} {label}")
+    return bool(passed)
+
+def _toy_recommender(num_posts=6, feature_dim=4):
+    """Minimal stand-in for NeuralGraphRecommenderMVP: a ring of posts, no model"""
+    post_ids = [f"post-{idx}" for idx in range(num_posts)]
+    ring = [(idx, (idx + 1) % num_posts) for idx in range(num_posts)]
+    edge_index = torch.tensor(ring + [(dst, src) for src, dst in ring], dtype=torch.long).t()
+    graph_data = Data(
+        x=torch.zeros(num_posts, feature_dim),
+        edge_index=edge_index,
+        edge_weight=torch.ones(edge_index.shape[1])
+    )
+    graph_builder = SimpleNamespace(
+        posts=[{'id': post_id} for post_id in post_ids],
+        post_to_idx={post_id: idx for idx, post_id in enumerate(post_ids)},
+        idx_to_post={idx: {'id': post_id} for idx, post_id in enumerate(post_ids)}
+    )
+    return SimpleNamespace(
+        graph_data=graph_data,
+        graph_builder=graph_builder,
+        graph_base_weight=None,
+        model=None,
+        mark_model_updated=lambda: None
+    )
+
+def _navigation(source, target):
+    """A click from one toy post to another (proposes a learned edge)"""
+    return {'post_id': target, 'action': 'click', 'context': {'source_post': source}}
+
+def test_interaction_log():
+    """Test the durable interaction log: replay, torn tails and compaction"""
+    print("\n📜 Testing Interaction Log")
+    print("=" * 50)
+    passed = True
+    
+    with tempfile.TemporaryDirectory() as log_dir:
+        # Records come back in append order across segment rotations
+        log = InteractionLog(log_dir, segment_max_bytes=256)
+        records = [{'post_id': f"post-{idx}", 'action': 'view'} for idx in range(20)]
+        for record in records:
+            log.append([record])
+        log.close()
+        replayed = [interaction for _, interaction in log.replay()]
+        passed &= _check(f"Replayed {len(replayed)} records over {len(log.segments())} segments", replayed == records)
+        
+        on_disk = sum(os.path.getsize(log.segment_path(segment)) for segment in log.segments())
+        passed &= _check("Running size matches the segment files", log.total_bytes() == on_disk)
+        
+        # A torn write at the tail of a segment loses only that record
+        log = InteractionLog(log_dir)
+        log.append([{'post_id': 'post-20', 'action': 'view'}, {'post_id': 'post-21', 'action': 'view'}])
+        log.close()
+        last = log.segment_path(log.segments()[-1])
+        with open(last, 'r+b') as f:
+            f.truncate(os.path.getsize(last) - 3)
+        replayed = [interaction for _, interaction in InteractionLog(log_dir).replay()]
+        passed &= _check("Torn tail record skipped, earlier records kept",
+                         replayed == records + [{'post_id': 'post-20', 'action': 'view'}])
+    
+    with tempfile.TemporaryDirectory() as log_dir:
+        # An engine rebuilds its learned edges from the log of a previous one
+        writer = RealtimeLearningEngine(_toy_recommender(), log_dir=log_dir)
+        for source, target in [(0, 3), (1, 4), (0, 3), (2, 5)]:
+            writer.record_interaction(_navigation(f"post-{source}", f"post-{target}"))
+        writer.record_interaction({'post_id': 'post-1', 'action': 'search_click', 'context': {'search_query': 'gnn'}})
+        asyncio.run(writer.update_model())
+        writer.interaction_log.close()
+        
+        async def replay_and_compact(engine):
+            await engine.start()
+            engine.compact_threshold_bytes = 0
+            await engine.update_model(force=True)
+            await engine.stop()
+        
+        replayer = RealtimeLearningEngine(_toy_recommender(), log_dir=log_dir)
+        asyncio.run(replay_and_compact(replayer))
+        passed &= _check(f"Replayed {replayer.stats['replayed_interactions']} logged interactions",
+                         replayer.stats['replayed_interactions'] == 5)
+        passed &= _check("Replayed edges match the original engine",
+                         np.array_equal(replayer._edge_keys, writer._edge_keys)
+                         and np.allclose(replayer._interaction_weight, writer._interaction_weight, rtol=1e-4))
+        passed &= _check("Replayed node features match the original engine",
+                         torch.equal(replayer.base_recommender.graph_data.x, writer.base_recommender.graph_data.x))
+        passed &= _check("Compaction folded the log into snapshot.npz",
+                         replayer.stats['log_compactions'] == 1 and os.path.exists(replayer.snapshot_path))
+        
+        # After compaction the state comes from the snapshot alone
+        async def restart(engine):
+            await engine.start()
+            await engine.stop()
+        
+        restored = RealtimeLearningEngine(_toy_recommender(), log_dir=log_dir)
+        asyncio.run(restart(restored))
+        passed &= _check("Snapshot restores the learned graph without replaying",
+                         restored.stats['replayed_interactions'] == 0
+                         and np.array_equal(restored._edge_keys, replayer._edge_keys)
+                         and torch.equal(restored.base_recommender.graph_data.x, replayer.base_recommender.graph_data.x))
+    
+    return passed
+
+def test_graph_snapshot():
+    """Test exporting a learned graph to .npz and serving it again"""
+    print("\n💾 Testing Graph Snapshots")
+    print("=" * 50)
+    passed = True
+    
+    exporter = RealtimeLearningEngine(_toy_recommender())
+    for source, target in [(0, 3), (1, 4), (0, 3)]:
+        exporter.record_interaction(_navigation(f"post-{source}", f"post-{target}"))
+    asyncio.run(exporter.update_model())
+    exported = exporter.base_recommender.graph_data
+    
+    with tempfile.TemporaryDirectory() as snapshot_dir:
+        path = os.path.join(snapshot_dir, "learned.npz")
+        passed &= _check("Exported learned graph", exporter.export_learned_graph(path))
+        
+        graph_data, post_ids, stats, base_weight = load_graph_snapshot(path)
+        passed &= _check("Edges, weights and features round-trip exactly",
+                         torch.equal(graph_data.edge_index, exported.edge_index)
+                         and torch.equal(graph_data.edge_weight, exported.edge_weight)
+                         and torch.equal(graph_data.x, exported.x))
+        passed &= _check("Post ids and stats round-trip",
+                         post_ids == exporter._post_ids().tolist()
+                         and stats['num_edges'] == exported.edge_index.shape[1])
+        
+        # A recommender serving the snapshot keeps the structural/learned split
+        served = _toy_recommender()
+        served.graph_data = graph_data
+        served.graph_base_weight = (graph_data.edge_index, base_weight)
+        engine = RealtimeLearningEngine(served)
+        engine._sync_edge_state()
+        learned = engine._base_weight == 0
+        passed &= _check(f"{int(learned.sum())} learned edges restored as learned",
+                         np.array_equal(engine._base_weight, exporter._base_weight)
+                         and np.allclose(engine._interaction_weight, exporter._interaction_weight)
+                         and learned.sum() == 4)
+        
+        # ...so they still decay and get pruned, while structural edges stay
+        engine._last_decay -= timedelta(days=60)
+        engine._update_graph_edges([])
+        passed &= _check("Learned edges decay and are pruned on the served graph",
+                         engine.stats['edges_pruned'] == 4 and bool((engine._base_weight > 0).all()))
+    
+    return passed
+
+def test_update_scheduling():
+    """Test that model updates skip idle runs, honor force and retry failures"""
+    print("\n⏱️  Testing Update Scheduling")
+    print("=" * 50)
+    passed = True
+    
+    recommender = _toy_recommender()
+    engine = RealtimeLearningEngine(recommender)
+    
+    passed &= _check("Update with no new interactions is skipped",
+                     asyncio.run(engine.update_model()) is False and engine.stats['skipped_updates'] == 1)
+    passed &= _check("Forced update runs anyway",
+                     asyncio.run(engine.update_model(force=True)) is True and engine.stats['model_updates'] == 1)
+    
+    # A failed update hands its interactions back for the next one
+    engine.record_interaction(_navigation("post-0", "post-3"))
+    engine.record_interaction(_navigation("post-1", "post-4"))
+    
+    def fail():
+        raise RuntimeError("embedding refresh failed")
+    recommender.mark_model_updated = fail
+    passed &= _check("Failed update reports failure",
+                     asyncio.run(engine.update_model()) is False and engine.stats['model_updates'] == 1)
+    passed &= _check("Failed update keeps its interactions pending",
+                     engine.has_pending_changes() and engine._events_since_update == 2)
+    
+    recommender.mark_model_updated = lambda: None
+    weights_before = engine._interaction_weight.copy()
+    passed &= _check("Retry succeeds without re-applying edge updates",
+                     asyncio.run(engine.update_model()) is True
+                     and np.allclose(engine._interaction_weight, weights_before, rtol=1e-4)
+                     and not engine.has_pending_changes())
+    
+    return passed
+
+def test_ga4_rollups():
+    """Test local GA4 daily rollups against the full-window query semantics"""
+    print("\n📈 Testing GA4 Rollups")
+    print("=" * 50)
+    passed = True
+    
+    today = date(2026, 10, 18)
+    first_day, second_day = table_suffix(today - timedelta(days=2)), table_suffix(today - timedelta(days=1))
+    page_a, page_b, page_c = (f"https://example.com/blog/{name}" for name in ('a', 'b', 'c'))
+    
+    def activity(day):
+        noon = datetime.strptime(day, '%Y%m%d').replace(hour=12, tzinfo=timezone.utc)
+        return int(noon.timestamp() * 1e6)
+    
+    def page_view(day, page, views, engagement_msec):
+        return SimpleNamespace(day=day, page_location=page, event_name='page_view', events=views,
+                               engagement_msec_sum=engagement_msec, engagement_msec_count=views,
+                               last_activity=activity(day))
+    
+    def visitor(day, page, user):
+        return SimpleNamespace(day=day, page_location=page, user_pseudo_id=user, event_mask=EVENT_BITS['page_view'])
+    
+    # Day one: u1 reads a then b, u2 reads a. Day two: u1 reads a then c.
+    page_events = [
+        page_view(first_day, page_a, 2, 60000), page_view(first_day, page_b, 1, 10000),
+        page_view(second_day, page_a, 1, 30000), page_view(second_day, page_c, 1, 20000)
+    ]
+    page_users = [
+        visitor(first_day, page_a, 'u1'), visitor(first_day, page_a, 'u2'), visitor(first_day, page_b, 'u1'),
+        visitor(second_day, page_a, 'u1'), visitor(second_day, page_c, 'u1')
+    ]
+    transitions = [
+        SimpleNamespace(day=first_day, previous_page=page_a, next_page=page_b, transition_count=1),
+        SimpleNamespace(day=second_day, previous_page=page_a, next_page=page_c, transition_count=1)
+    ]
+    user_day_bounds = [
+        SimpleNamespace(day=first_day, user_pseudo_id='u1', first_page=page_a, last_page=page_b),
+        SimpleNamespace(day=first_day, user_pseudo_id='u2', first_page=page_a, last_page=page_a),
+        SimpleNamespace(day=second_day, user_pseudo_id='u1', first_page=page_a, last_page=page_c)
+    ]
+    
+    with tempfile.TemporaryDirectory() as rollup_dir:
+        store = GA4RollupStore(os.path.join(rollup_dir, "rollups.sqlite"))
+        
+        days = store.days_to_fetch(today)
+        passed &= _check(f"Empty store fetches the whole retention window ({len(days)} days)",
+                         len(days) == store.retention_days + 1)
+        
+        store.replace_days(days, page_events, page_users, transitions, user_day_bounds, today)
+        unsettled = [table_suffix(today - timedelta(days=offset)) for offset in range(SETTLE_DAYS, -1, -1)]
+        passed &= _check(f"Next sync only re-fetches the {len(unsettled)} unsettled days",
+                         store.days_to_fetch(today) == unsettled)
+        
+        start, end = table_suffix(today - timedelta(days=7)), table_suffix(today)
+        engagement = {row.page_location: row for row in store.page_engagement(start, end)}
+        passed &= _check("Distinct users are exact across days",
+                         engagement[page_a].unique_users == 2 and engagement[page_a].page_views == 3)
+        passed &= _check("Average engagement time is weighted by events",
+                         abs(engagement[page_a].avg_engagement_time_sec - 30.0) < 1e-9)
+        
+        journeys = {(row.previous_page, row.next_page): row.transition_count
+                    for row in store.user_journeys(start, end, min_count=1)}
+        passed &= _check("Journeys include the transition across midnight",
+                         journeys == {(page_a, page_b): 1, (page_a, page_c): 1, (page_b, page_a): 1})
+        
+        trending = store.trending_activity(start, end, today)
+        expected_score = (2 * 2 + 3) * math.exp(-1 / 3.0)
+        passed &= _check("Trending score matches the BigQuery formula",
+                         trending[0].page_location == page_a
+                         and abs(trending[0].trend_score - expected_score) < 1e-9)
+        
+        # Windows only count the days they cover
+        one_day = store.page_engagement(second_day, second_day)
+        passed &= _check("Shorter windows only count their own days",
+                         {row.page_location: row.unique_users for row in one_day} == {page_a: 1, page_c: 1})
+        
+        # Late events for a day still settling replace its rollups on the
+        # next sync (without double counting), and then the day turns final
+        later = today + timedelta(days=1)
+        days = store.days_to_fetch(later)
+        late_events = [row for row in page_events if row.day != first_day] + [
+            page_view(first_day, page_a, 5, 60000), page_view(first_day, page_b, 1, 10000)
+        ]
+        late_users = page_users + [visitor(first_day, page_b, 'u3')]
+        store.replace_days(days, late_events, late_users, transitions, user_day_bounds, later)
+        engagement = {row.page_location: row for row in store.page_engagement(first_day, first_day)}
+        passed &= _check("Late events for an unsettled day are picked up",
+                         first_day in days
+                         and engagement[page_a].page_views == 5 and engagement[page_b].unique_users == 2)
+        passed &= _check("Days older than the settle window become final",
+                         table_suffix(later - timedelta(days=SETTLE_DAYS + 1)) not in store.days_to_fetch(later))
+    
+    return passed
+
+def test_ga4_refresh_failure():
+    """Test that a failed GA4 rollup sync keeps the served signals and their snapshot"""
+    print("\n🛟 Testing GA4 Refresh Failure")
+    print("=" * 50)
+    passed = True
+    
+    class FailingClient:
+        def query(self, query, **kwargs):
+            raise RuntimeError("BigQuery unavailable")
+    
+    with tempfile.TemporaryDirectory() as cache_dir:
+        snapshot_path = os.path.join(cache_dir, "ga4-signals.json")
+        fetched_at = datetime.now() - timedelta(hours=5)
+        engagement = {'/blog/post-1': 42.0}
+        trending = [{'path': '/blog/post-1', 'unique_users': 3, 'total_events': 9, 'trend_score': 15.0}]
+        with open(snapshot_path, 'w') as f:
+            json.dump({
+                'timestamp': fetched_at.isoformat(),
+                'engagement': engagement,
+                'journeys': {},
+                'trending': trending
+            }, f)
+        with open(snapshot_path, 'rb') as f:
+            snapshot_before = f.read()
+        
+        # Empty rollup store, so only a successful sync could answer locally
+        analyzer = GA4BehaviorAnalyzer(
+            "test-project", "analytics_test", rollup_path=os.path.join(cache_dir, "ga4-rollups.sqlite")
+        )
+        analyzer.client = FailingClient()
+        enhanced = EnhancedGraphRecommender(_toy_recommender(), analyzer, snapshot_path=snapshot_path)
+        asyncio.run(enhanced.update_behavior_signals())
+        analyzer.shutdown()
+        
+        with open(snapshot_path, 'rb') as f:
+            snapshot_after = f.read()
+        
+        passed &= _check("Signals from before the failure are still served",
+                         enhanced.engagement_cache == engagement and enhanced.trending_cache == trending)
+        passed &= _check("Data age still reflects the last successful fetch",
+                         enhanced.cache_timestamp == fetched_at and enhanced.get_data_age() >= 5 * 3600)
+        passed &= _check("Snapshot file left untouched", snapshot_after == snapshot_before)
+    
+    return passed
+
+def test_ga4_query_cancellation():
+    """Test that a GA4 query timing out during job submission still cancels the job"""
+    print("\n⏹️  Testing GA4 Query Cancellation")
+    print("=" * 50)
+    events = []
+    
+    class SlowJob:
+        job_id = "slow-job"
+        
+        def result(self, timeout=None):
+            return []
+        
+        def cancel(self):
+            events.append('cancelled')
+            return True
+    
+    class SlowSubmitClient:
+        def query(self, query, **kwargs):
+            time.sleep(0.5)
+            events.append('created')
+            return SlowJob()
+    
+    async def time_out_then_wait():
+        try:
+            await analyzer._run_query("SELECT 1", timeout=0.1)
+        except asyncio.TimeoutError:
+            events.append('timed out')
+        await asyncio.sleep(1.0)
+    
+    analyzer = GA4BehaviorAnalyzer("test-project", "analytics_test")
+    analyzer.client = SlowSubmitClient()
+    asyncio.run(time_out_then_wait())
+    analyzer.shutdown()
+    
+    return _check(f"Job created after the timeout is cancelled ({', '.join(events)})",
+                  events == ['timed out', 'created', 'cancelled'])
+
 if __name__ == "__main__":
-    success = test_gnn_mvp()
-    sys.exit(0 if success else 1)
\ No newline at end of file
+    results = [
+        test_gnn_mvp(),
+        test_interaction_log(),
+        test_graph_snapshot(),
+        test_update_scheduling(),
+        test_ga4_rollups(),
+        test_ga4_refresh_failure(),
+        test_ga4_query_cancellation()
+    ]
+    sys.exit(0 if all(results) else 1)
\ No newline at end of file